@@ -1,5 +1,16 @@
+import queue
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Iterator
+
 import bs4
+import requests
+from requests.adapters import HTTPAdapter
 from langchain_community.document_loaders import WebBaseLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain_openai import OpenAIEmbeddings
@@ -58,5 +69,180 @@ def demonstrate_loading_and_splitting():
     except Exception as e:
         print(f"Skipping Semantic Splitting (requires valid OpenAI Key): {e}")
 
+
+# --- Concept: Pipelined Ingestion ---
+# loader.load() fetches every URL one after another and only THEN we split.
+# For 10,000+ pages that means: latency = sum of all downloads, and RAM = the whole corpus.
+# Instead we build a 3-stage pipeline:
+#   [Fetch: N threads, bounded pool] -> [Bounded Queue] -> [Parse + Split: generator]
+# Chunks are yielded as soon as their page arrives, and the bounded queue applies
+# backpressure, so peak memory depends on queue_size, not on the corpus size.
+
+_END_OF_STREAM = object()
+
+
+class _ProducerError:
+    """Carries an exception from the fetch thread to the consumer, which re-raises it."""
+    def __init__(self, error: BaseException):
+        self.error = error
+
+def stream_load_and_split(
+    urls: Iterable[str],
+    text_splitter,
+    max_workers: int = 8,
+    queue_size: int = 32,
+    bs_kwargs: dict = None,
+    timeout: float = 10.0,
+) -> Iterator[Document]:
+    """Fetch URLs concurrently and yield split chunks as soon as each page is ready.
+
+    `urls` may be a lazy iterator, so the URL list itself never has to fit in memory.
+    """
+    pages = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    # One session = one connection pool. pool_maxsize caps open sockets per host.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def put(item):
+        # Blocks while the queue is full (backpressure), but wakes up if the consumer quits.
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def fetch(url):
+        try:
+            response = session.get(url, timeout=timeout)
+            response.raise_for_status()
+            return url, response.text, None
+        except requests.RequestException as e:
+            return url, None, e
+
+    def producer():
+        error = None
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                in_flight = set()
+                try:
+                    for url in urls:
+                        if stop.is_set():
+                            break
+                        # Never have more than 2x workers requests pending -> bounded memory.
+                        if len(in_flight) >= max_workers * 2:
+                            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                put(future.result())
+                        in_flight.add(pool.submit(fetch, url))
+                except Exception as e:
+                    error = e  # The URL iterator failed: still deliver the pages already in flight
+                while in_flight and not stop.is_set():
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        put(future.result())
+        except Exception as e:
+            error = error or e
+        finally:
+            if error is not None:
+                put(_ProducerError(error))
+            put(_END_OF_STREAM)
+
+    fetcher = threading.Thread(target=producer, daemon=True)
+    fetcher.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, _ProducerError):
+                raise item.error  # Never end "normally" with a silently truncated corpus
+            url, html, error = item
+            if error is not None:
+                print(f"[Warn] Skipping {url}: {error}")
+                continue
+            # Same parsing as WebBaseLoader: BeautifulSoup + optional SoupStrainer.
+            soup = bs4.BeautifulSoup(html, "html.parser", **(bs_kwargs or {}))
+            doc = Document(page_content=soup.get_text(), metadata={"source": url})
+            yield from text_splitter.split_documents([doc])
+    finally:
+        # Runs on normal exit AND when the caller stops iterating early.
+        stop.set()
+        fetcher.join(timeout=1)
+        session.close()
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Serves synthetic blog posts so we can benchmark without hammering real sites."""
+    latency = 0.05
+    paragraphs = 40
+
+    def do_GET(self):
+        time.sleep(self.latency)  # Simulate network / server time
+        body = "".join(
+            f"<p>Paragraph {i} of {self.path}. Agents plan, use tools and reflect on results.</p>\n"
+            for i in range(self.paragraphs)
+        )
+        html = f"<html><body><div class='post-content'>{body}</div></body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(html)))
+        self.end_headers()
+        self.wfile.write(html)
+
+    def log_message(self, *args):
+        pass  # Keep benchmark output clean
+
+
+def benchmark_streaming_ingestion(num_pages: int = 200, latency: float = 0.05, max_workers: int = 16):
+    print(f"\n--- 4. Benchmark: Sequential vs Pipelined ({num_pages} pages, {latency * 1000:.0f}ms each) ---")
+    _StandInHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+
+    # A) The classic way: download everything, then split everything.
+    tracemalloc.start()
+    start = time.perf_counter()
+    docs = []
+    for i in range(num_pages):
+        html = requests.get(f"{base_url}/page/{i}", timeout=10).text
+        docs.append(Document(page_content=bs4.BeautifulSoup(html, "html.parser").get_text(), metadata={"source": str(i)}))
+    splits = text_splitter.split_documents(docs)
+    sequential_time = time.perf_counter() - start
+    _, sequential_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Sequential: {len(splits)} chunks in {sequential_time:.2f}s "
+          f"({num_pages / sequential_time:.1f} pages/s), peak RAM {sequential_peak / 1e6:.1f} MB")
+    del docs, splits
+
+    # B) Pipelined: chunks are consumed (e.g. embedded) as they stream out.
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_chunk_at = None
+    num_chunks = 0
+    urls = (f"{base_url}/page/{i}" for i in range(num_pages))  # Lazy: no URL list in memory
+    for _ in stream_load_and_split(urls, text_splitter, max_workers=max_workers):
+        if first_chunk_at is None:
+            first_chunk_at = time.perf_counter() - start
+        num_chunks += 1
+    pipelined_time = time.perf_counter() - start
+    _, pipelined_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Pipelined:  {num_chunks} chunks in {pipelined_time:.2f}s "
+          f"({num_pages / pipelined_time:.1f} pages/s), peak RAM {pipelined_peak / 1e6:.1f} MB, "
+          f"first chunk after {first_chunk_at * 1000:.0f}ms")
+    print(f"Speedup: {sequential_time / pipelined_time:.1f}x")
+
+    server.shutdown()
+    server.server_close()
+
 if __name__ == "__main__":
     demonstrate_loading_and_splitting()
+    benchmark_streaming_ingestion()
@@ -0,0 +1,169 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Concept: Content-Addressed Embedding Cache ---
+# Embeddings are a pure function: same model + same text = same vector.
+# So we never need to pay for the same (model, text) pair twice.
+# 1. KEY: sha256(model + text) -> the "address" of the vector.
+# 2. STORE: SQLite on disk (survives restarts, shared by scripts).
+# 3. EVICT: Least-Recently-Used rows are deleted once the cache is over its size cap.
+
+class PersistentEmbeddingCache(Embeddings):
+    """Wraps any Embeddings model with an on-disk, LRU-capped SQLite cache."""
+
+    # SQLite allows at most 999 "?" parameters per statement in older builds.
+    _SQL_BATCH = 500
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        db_path: str = "embedding_cache.sqlite",
+        model_name: Optional[str] = None,
+        max_entries: int = 500_000,
+        batch_size: int = 256,
+    ):
+        self.underlying = underlying
+        # The model is part of the key: vectors from different models must never mix.
+        self.model_name = model_name or getattr(underlying, "model", type(underlying).__name__)
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        # A logical clock is cheaper and collision-free compared to wall-clock timestamps.
+        self._clock = self._conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+
+    def _key(self, text: str, kind: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> dict:
+        """Batched lookup: one SELECT per 500 keys instead of one per text."""
+        found = {}
+        with self._lock:
+            self._clock += 1
+            for i in range(0, len(keys), self._SQL_BATCH):
+                batch = keys[i:i + self._SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                if rows:
+                    # Touch the hits so LRU eviction keeps them.
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                        [self._clock, *batch],
+                    )
+            self._conn.commit()
+        return found
+
+    def _store(self, items: dict):
+        with self._lock:
+            self._clock += 1
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(k, np.asarray(v, dtype=np.float32).tobytes(), self._clock) for k, v in items.items()],
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+            self._conn.commit()
+
+    def _embed_cached(self, texts: List[str], kind: str, embed_fn) -> List[List[float]]:
+        keys = [self._key(t, kind) for t in texts]
+        cached = self._lookup(list(dict.fromkeys(keys)))
+
+        # Deduplicate misses: the same new text twice in one call is embedded once.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        self.hits += len(texts) - sum(1 for k in keys if k in missing)
+        self.misses += len(missing)
+
+        if missing:
+            missing_keys = list(missing)
+            for i in range(0, len(missing_keys), self.batch_size):
+                batch_keys = missing_keys[i:i + self.batch_size]
+                vectors = embed_fn([missing[k] for k in batch_keys])
+                new_items = dict(zip(batch_keys, vectors))
+                self._store(new_items)
+                cached.update(new_items)
+
+        return [list(cached[k]) for k in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_cached(texts, "doc", self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Some models embed queries differently from documents, so they get their own key space.
+        return self._embed_cached([text], "query", lambda ts: [self.underlying.embed_query(ts[0])])[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0],
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+def demonstrate_embedding_cache():
+    # Offline stand-in. In production: OpenAIEmbeddings(model="text-embedding-3-small")
+    base_embeddings = DeterministicFakeEmbedding(size=1536)
+    cached_embeddings = PersistentEmbeddingCache(
+        base_embeddings, db_path="embedding_cache.sqlite", model_name="text-embedding-3-small"
+    )
+
+    corpus = [f"Chunk {i}: LangChain retrieval notes, section {i}." for i in range(2000)]
+
+    print("--- 1. Day 1: Ingest the corpus ---")
+    start = time.perf_counter()
+    cached_embeddings.embed_documents(corpus)
+    print(f"Took {time.perf_counter() - start:.2f}s. Stats: {cached_embeddings.stats()}")
+
+    print("\n--- 2. Day 2: Re-ingest with 5% of chunks edited ---")
+    cached_embeddings.hits = cached_embeddings.misses = 0
+    corpus_v2 = [t + " (edited)" if i % 20 == 0 else t for i, t in enumerate(corpus)]
+    start = time.perf_counter()
+    cached_embeddings.embed_documents(corpus_v2)
+    stats = cached_embeddings.stats()
+    print(f"Took {time.perf_counter() - start:.2f}s. Stats: {stats}")
+    print(f"Embedding calls avoided: {stats['hits']} of {len(corpus_v2)} texts.")
+
+    # Drop-in: any LangChain component that takes `embedding=` works unchanged, e.g.
+    # Chroma.from_documents(docs, embedding=cached_embeddings)
+    cached_embeddings.close()
+
+if __name__ == "__main__":
+    demonstrate_embedding_cache()
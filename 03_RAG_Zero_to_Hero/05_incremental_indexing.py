@@ -0,0 +1,108 @@
+from typing import Dict, List
+from langchain.indexes import SQLRecordManager, index
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Concept: Incremental Indexing ---
+# Chroma.from_documents(...) + delete_collection() = rebuild + re-embed EVERYTHING on every refresh.
+# Instead we keep a "Record Manager" (a small SQL table) next to the vector store:
+#   chunk_id (hash of content + metadata) | source_id | updated_at
+# On every refresh we diff the new corpus against that table:
+#   - Unchanged chunk -> SKIP   (no embedding, no write)
+#   - New/edited chunk -> ADD   (embed + upsert)
+#   - Chunk no longer produced by its source -> DELETE
+# Cost of a nightly refresh = size of the day's changes, not size of the corpus.
+
+COLLECTION_NAME = "incremental_collection"
+
+class CountingEmbeddings(Embeddings):
+    """Counts how many texts actually hit the (paid) embedding model."""
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+        self.embedded_texts = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded_texts += len(texts)
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+
+def build_chunks(corpus: Dict[str, str]) -> List[Document]:
+    """Split every source document. Each chunk keeps its `source` so it can be diffed per source."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=0)
+    docs = [Document(page_content=text, metadata={"source": source}) for source, text in corpus.items()]
+    return splitter.split_documents(docs)
+
+
+def refresh_index(corpus: Dict[str, str], vector_store, record_manager):
+    """Sync the vector store with `corpus`. Safe to run as often as you like."""
+    # cleanup="full": the corpus passed in is the WHOLE truth, so sources that disappeared are deleted too.
+    # Use cleanup="incremental" when you only pass the sources that changed (e.g. from a webhook).
+    return index(
+        build_chunks(corpus),
+        record_manager,
+        vector_store,
+        cleanup="full",
+        source_id_key="source",
+    )
+
+
+def demonstrate_incremental_indexing():
+    # Offline stand-in. In production: OpenAIEmbeddings(model="text-embedding-3-small")
+    embeddings = CountingEmbeddings(DeterministicFakeEmbedding(size=1536))
+
+    # Both live on disk, so the next run of this script can pick up where this one stopped.
+    vector_store = Chroma(
+        collection_name=COLLECTION_NAME,
+        embedding_function=embeddings,
+        persist_directory="./chroma_incremental",
+    )
+    record_manager = SQLRecordManager(
+        namespace=f"chroma/{COLLECTION_NAME}",
+        db_url="sqlite:///record_manager_cache.sql",
+    )
+    record_manager.create_schema()
+
+    # Start the lesson from a clean slate: indexing "nothing" with full cleanup deletes everything.
+    index([], record_manager, vector_store, cleanup="full", source_id_key="source")
+
+    corpus = {
+        "history.md": "LangChain was launched in October 2022 by Harrison Chase. " * 10,
+        "features.md": "LangGraph allows creating cyclic agentic workflows. " * 10,
+        "fruit.md": "Apples are a type of fruit that grow on trees. " * 10,
+    }
+
+    print("--- 1. Day 1: First ingest ---")
+    result = refresh_index(corpus, vector_store, record_manager)
+    print(f"Result: {result} | Texts embedded: {embeddings.embedded_texts}")
+
+    print("\n--- 2. Day 1 (again): Nothing changed ---")
+    embeddings.embedded_texts = 0
+    result = refresh_index(corpus, vector_store, record_manager)
+    print(f"Result: {result} | Texts embedded: {embeddings.embedded_texts}")
+
+    print("\n--- 3. Day 2: One doc edited, one deleted, one added ---")
+    embeddings.embedded_texts = 0
+    corpus["features.md"] = corpus["features.md"].replace("cyclic", "stateful, cyclic", 1)
+    del corpus["fruit.md"]
+    corpus["pricing.md"] = "LangSmith has a free developer tier. " * 5
+    result = refresh_index(corpus, vector_store, record_manager)
+    print(f"Result: {result} | Texts embedded: {embeddings.embedded_texts}")
+
+    # The record manager is the "ledger": source id -> chunk ids.
+    for source in corpus:
+        chunk_ids = record_manager.list_keys(group_ids=[source])
+        print(f"{source}: {len(chunk_ids)} chunks, e.g. {chunk_ids[0][:12]}...")
+
+    results = vector_store.similarity_search("Who created LangChain?", k=1)
+    print(f"\nQuery still works: {results[0].metadata['source']}")
+
+if __name__ == "__main__":
+    demonstrate_incremental_indexing()
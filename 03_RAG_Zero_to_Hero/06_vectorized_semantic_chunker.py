@@ -0,0 +1,173 @@
+import re
+import time
+import uuid
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
+from langchain_experimental.text_splitter import SemanticChunker
+from langchain_openai import OpenAIEmbeddings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Concept: Embed Once, Use Twice ---
+# SemanticChunker embeds EVERY sentence to find topic shifts... and then throws those vectors away.
+# The vector store then embeds every CHUNK again. You pay twice for the same text.
+# Here:
+# 1. Embed sentences once, L2-normalize them into one matrix E (n_sentences x dim).
+# 2. Cosine distance of neighbours in ONE NumPy op: 1 - sum(E[:-1] * E[1:], axis=1)
+# 3. Break where the distance is in the top X% (percentile threshold).
+# 4. Chunk embedding = normalized mean of its sentence vectors (mean pooling). No second pass.
+
+_SENTENCE_RE = re.compile(r"[^.?!\s][^.?!]*(?:[.?!]+|$)")
+
+def iter_sentences(text: str) -> Iterator[Tuple[int, int]]:
+    """Lazily yields (start, end) offsets of each sentence. Never builds a list of all sentences."""
+    for match in _SENTENCE_RE.finditer(text):
+        yield match.start(), match.end()
+
+
+class VectorizedSemanticChunker:
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        breakpoint_percentile: float = 95.0,
+        window_sentences: int = 2000,
+    ):
+        self.embeddings = embeddings
+        self.breakpoint_percentile = breakpoint_percentile
+        # How many sentences are embedded and compared at once. Bounds memory for huge documents.
+        self.window_sentences = window_sentences
+
+    def _embed(self, sentences: List[str]) -> np.ndarray:
+        matrix = np.asarray(self.embeddings.embed_documents(sentences), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def _make_chunk(self, text: str, spans: List[Tuple[int, int]], vectors: np.ndarray):
+        start, end = spans[0][0], spans[-1][1]
+        pooled = vectors.mean(axis=0)
+        pooled /= max(np.linalg.norm(pooled), 1e-12)
+        return text[start:end].strip(), start, pooled
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, int, np.ndarray]]:
+        """Streams (chunk_text, start_index, chunk_embedding) one window of sentences at a time."""
+        carry_spans: List[Tuple[int, int]] = []
+        carry_vectors = np.empty((0, 0), dtype=np.float32)
+        sentences = iter_sentences(text)
+
+        while True:
+            window = [span for _, span in zip(range(self.window_sentences), sentences)]
+            if not window:
+                break
+            vectors = self._embed([text[s:e] for s, e in window])
+
+            spans = carry_spans + window
+            matrix = np.vstack([carry_vectors, vectors]) if len(carry_spans) else vectors
+
+            # The whole trick: all neighbour distances in one vectorized expression.
+            distances = 1.0 - np.einsum("ij,ij->i", matrix[:-1], matrix[1:])
+            if len(distances):
+                threshold = np.percentile(distances, self.breakpoint_percentile)
+                chunk_starts = [0, *(np.flatnonzero(distances > threshold) + 1)]
+            else:
+                chunk_starts = [0]
+
+            # Every chunk except the last one is final. The last one may continue in the next window.
+            for a, b in zip(chunk_starts[:-1], chunk_starts[1:]):
+                yield self._make_chunk(text, spans[a:b], matrix[a:b])
+            carry_spans = spans[chunk_starts[-1]:]
+            carry_vectors = matrix[chunk_starts[-1]:]
+
+            # No topic shift in a whole window: flush anyway so memory stays bounded.
+            if len(carry_spans) >= self.window_sentences:
+                yield self._make_chunk(text, carry_spans, carry_vectors)
+                carry_spans, carry_vectors = [], np.empty((0, 0), dtype=np.float32)
+
+        if carry_spans:
+            yield self._make_chunk(text, carry_spans, carry_vectors)
+
+    def split_documents_with_embeddings(self, docs: List[Document]) -> Tuple[List[Document], List[List[float]]]:
+        chunks, vectors = [], []
+        for doc in docs:
+            for chunk_text, start, vector in self.iter_chunks(doc.page_content):
+                chunks.append(Document(page_content=chunk_text, metadata={**doc.metadata, "start_index": start}))
+                vectors.append(vector.tolist())
+        return chunks, vectors
+
+    def split_documents(self, docs: List[Document]) -> List[Document]:
+        """Drop-in replacement for SemanticChunker.split_documents."""
+        return self.split_documents_with_embeddings(docs)[0]
+
+
+def add_with_precomputed_embeddings(vector_store: Chroma, docs: List[Document], vectors: List[List[float]]):
+    # Chroma's add_documents() always calls the embedding model, so we upsert the
+    # pooled vectors straight into the underlying collection.
+    vector_store._collection.upsert(
+        ids=[str(uuid.uuid4()) for _ in docs],
+        embeddings=vectors,
+        documents=[d.page_content for d in docs],
+        metadatas=[d.metadata for d in docs],
+    )
+
+
+class CountingEmbeddings(Embeddings):
+    """Counts how many texts hit the embedding model."""
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+        self.embedded_texts = 0
+
+    def embed_documents(self, texts):
+        self.embedded_texts += len(texts)
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.underlying.embed_query(text)
+
+
+def demonstrate_vectorized_chunker():
+    text = (
+        "LangChain is a framework for building LLM apps. It offers chains, agents and retrievers. "
+        "Developers use LCEL to compose runnables. "
+        "Apples are a popular fruit. They grow on trees in temperate climates. Orchards harvest them in autumn. "
+        "The stock market closed higher today. Tech shares led the gains. Investors expect rate cuts."
+    )
+    docs = [Document(page_content=text, metadata={"source": "mixed_topics"})]
+
+    print("--- 1. Vectorized Semantic Splitting (chunks + embeddings in one pass) ---")
+    try:
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        chunker = VectorizedSemanticChunker(embeddings, breakpoint_percentile=70)
+        chunks, vectors = chunker.split_documents_with_embeddings(docs)
+        for chunk in chunks:
+            print(f"[start={chunk.metadata['start_index']}] {chunk.page_content}")
+
+        vector_store = Chroma(collection_name="semantic_chunks", embedding_function=embeddings)
+        add_with_precomputed_embeddings(vector_store, chunks, vectors)
+        print(f"\nIndexed {len(chunks)} chunks without a second embedding pass.")
+        print(f"Query 'fruit' -> {vector_store.similarity_search('fruit', k=1)[0].page_content}")
+        vector_store.delete_collection()
+    except Exception as e:
+        print(f"Skipping live demo (requires valid OpenAI Key): {e}")
+
+    print("\n--- 2. Benchmark: SemanticChunker + re-embed vs Vectorized (fake embeddings) ---")
+    long_doc = [Document(page_content=" ".join(f"Sentence number {i} about topic {i // 25}." for i in range(5000)))]
+
+    classic_embeddings = CountingEmbeddings(DeterministicFakeEmbedding(size=256))
+    start = time.perf_counter()
+    classic_chunks = SemanticChunker(classic_embeddings).split_documents(long_doc)
+    classic_embeddings.embed_documents([c.page_content for c in classic_chunks])  # The indexing pass
+    classic_time = time.perf_counter() - start
+    print(f"SemanticChunker: {len(classic_chunks)} chunks, {classic_embeddings.embedded_texts} texts embedded, {classic_time:.2f}s")
+
+    fast_embeddings = CountingEmbeddings(DeterministicFakeEmbedding(size=256))
+    start = time.perf_counter()
+    fast_chunks, _ = VectorizedSemanticChunker(fast_embeddings, window_sentences=1000).split_documents_with_embeddings(long_doc)
+    fast_time = time.perf_counter() - start
+    print(f"Vectorized:      {len(fast_chunks)} chunks, {fast_embeddings.embedded_texts} texts embedded, {fast_time:.2f}s")
+
+if __name__ == "__main__":
+    demonstrate_vectorized_chunker()
@@ -0,0 +1,446 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from urllib.parse import quote
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
+from langchain_core.vectorstores import VectorStore
+from langchain_openai import OpenAIEmbeddings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Concept: A Vector Store is a Matrix ---
+# Strip away the marketing and a vector store is:
+# 1. A matrix M (n_docs x dim) of normalized embeddings.
+# 2. scores = M @ query          (one BLAS call = cosine similarity for every doc)
+# 3. top-k  = argpartition(scores, -k)   (O(n), no full sort)
+# Persistence: M is saved as a .npy file and opened with np.load(mmap_mode="r").
+# The OS maps the file into memory lazily, so a 10GB index "opens" in milliseconds,
+# and 8 worker processes reading the same file share ONE copy in the page cache.
+# Metadata filters: an attribute index (the set of row ids per metadata value) picks the matching rows
+# BEFORE scoring, so a filtered query scores only those rows and still returns a full k.
+
+class NumpyVectorStore(VectorStore):
+    """In-process vector store: contiguous float32/float16 matrix + SQLite docstore."""
+
+    _SCAN_BLOCK = 262_144  # Rows scored per matmul; bounds temporary memory for float16 upcasts
+    _SQL_BATCH = 500       # SQLite limits the number of "?" parameters per statement
+    _GATHER_RATIO = 0.25   # Filter matches fewer rows than this fraction -> score only those rows
+
+    def __init__(self, embedding: Embeddings, dtype=np.float32, persist_directory: Optional[str] = None):
+        self._embedding = embedding
+        self.dtype = np.dtype(dtype)
+        self.persist_directory = persist_directory
+        self._matrix = None   # (capacity x dim). Rows >= self._count are unused capacity
+        self._alive = None    # Deleted rows are tombstoned here, not moved
+        self._count = 0
+        # Attribute index: metadata key -> value -> row ids. None = not built yet (after load()).
+        # Sparse on purpose: memory grows with the rows that HAVE a value, not rows x distinct values.
+        self._attributes: Optional[Dict[str, Dict[Any, Set[int]]]] = {}
+        self._row_arrays: Dict[Tuple[str, Any], np.ndarray] = {}  # Same row ids as int arrays, rebuilt after a change
+        # Texts and metadata live in SQLite: only the k rows we return are ever deserialized.
+        self._docstore = sqlite3.connect(":memory:", check_same_thread=False)
+        self._docstore_on_disk = False  # After load(): read-only view of the persisted file until the first write
+        self._docstore.execute(
+            "CREATE TABLE docs (row INTEGER PRIMARY KEY, id TEXT UNIQUE, text TEXT, metadata TEXT)"
+        )
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _select_in(self, sql: str, values: List) -> List[tuple]:
+        """Runs `sql` (containing one `IN ({})`) in batches of 500 values."""
+        rows = []
+        for i in range(0, len(values), self._SQL_BATCH):
+            batch = values[i:i + self._SQL_BATCH]
+            rows.extend(self._docstore.execute(sql.format(",".join("?" * len(batch))), batch).fetchall())
+        return rows
+
+    # --- Writing ---
+    def _writable_docstore(self) -> sqlite3.Connection:
+        # Writes must not reach the persisted file before persist(): vectors.npy/alive.npy would be out of sync.
+        if self._docstore_on_disk:
+            memory = sqlite3.connect(":memory:", check_same_thread=False)
+            self._docstore.backup(memory)
+            self._docstore.close()
+            self._docstore, self._docstore_on_disk = memory, False
+        return self._docstore
+
+    def _ensure_capacity(self, n_new: int, dim: int):
+        if self._matrix is None:
+            capacity = max(1024, n_new)
+            self._matrix = np.zeros((capacity, dim), dtype=self.dtype)
+            self._alive = np.zeros(capacity, dtype=bool)
+        elif self._count + n_new > len(self._matrix) or not self._matrix.flags.writeable:
+            # Amortized doubling (like list.append). Also turns a read-only memmap into RAM on first write.
+            capacity = max(len(self._matrix) * 2, self._count + n_new)
+            matrix = np.zeros((capacity, dim), dtype=self.dtype)
+            matrix[:self._count] = self._matrix[:self._count]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self._count] = self._alive[:self._count]
+            self._matrix, self._alive = matrix, alive
+
+    @staticmethod
+    def _indexed_values(metadata: dict) -> Iterator[Tuple[str, Any]]:
+        return ((k, v) for k, v in metadata.items() if isinstance(v, (str, int, float, bool)))  # Scalars only, like Chroma
+
+    def _unindex_metadata(self, old: Dict[int, dict]):
+        """Drops rows from the index, given each row's OLD metadata (so only its own values are touched)."""
+        if self._attributes is None:
+            return
+        for row, metadata in old.items():
+            for key, value in self._indexed_values(metadata):
+                self._attributes.get(key, {}).get(value, set()).discard(row)
+                self._row_arrays.pop((key, value), None)
+
+    def _index_metadata(self, rows: List[int], metadatas: List[dict]):
+        if self._attributes is None:
+            return  # Built from the docstore on the first filtered query
+        for row, metadata in zip(rows, metadatas):
+            for key, value in self._indexed_values(metadata):
+                self._attributes.setdefault(key, {}).setdefault(value, set()).add(row)
+                self._row_arrays.pop((key, value), None)
+
+    def _build_attribute_index(self):
+        # Reads only the docstore: a memory-mapped matrix stays mapped and read-only.
+        self._attributes, self._row_arrays = {}, {}
+        for start in range(0, self._count, 50_000):
+            found = self._docstore.execute(
+                "SELECT row, metadata FROM docs WHERE row >= ? AND row < ?", (start, start + 50_000)
+            ).fetchall()
+            if found:
+                rows, metadatas = zip(*found)
+                self._index_metadata(rows, [json.loads(m) for m in metadatas])
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Adds pre-computed vectors (e.g. from 06_vectorized_semantic_chunker.py). Existing ids are upserted."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        last = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(last) < len(ids):  # Same id twice in one call: the last copy wins, like a second upsert
+            keep = sorted(last.values())
+            texts, metadatas, ids = [texts[i] for i in keep], [metadatas[i] for i in keep], [ids[i] for i in keep]
+            vectors = vectors[keep]
+
+        # Upsert: an existing id keeps its row and gets overwritten in place.
+        found = self._select_in("SELECT id, row, metadata FROM docs WHERE id IN ({})", ids)
+        existing = {doc_id: row for doc_id, row, _ in found}
+        n_new = sum(1 for i in ids if i not in existing)
+        self._ensure_capacity(n_new, vectors.shape[1])
+
+        self._unindex_metadata({row: json.loads(metadata) for _, row, metadata in found})  # Upserts drop old values
+        rows = []
+        for doc_id in ids:
+            if doc_id in existing:
+                rows.append(existing[doc_id])
+            else:
+                rows.append(self._count)
+                existing[doc_id] = self._count
+                self._count += 1
+        rows = np.asarray(rows)
+        self._matrix[rows] = vectors.astype(self.dtype)
+        self._alive[rows] = True
+        self._index_metadata(rows.tolist(), metadatas)
+
+        docstore = self._writable_docstore()
+        docstore.executemany(
+            "INSERT OR REPLACE INTO docs (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+            [(int(r), i, t, json.dumps(m)) for r, i, t, m in zip(rows, ids, texts, metadatas)],
+        )
+        docstore.commit()
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        found = self._select_in("SELECT row, metadata FROM docs WHERE id IN ({})", ids)
+        rows = [r for r, _ in found]
+        if rows:
+            if not self._alive.flags.writeable:
+                self._alive = np.array(self._alive)  # Copy only the tombstones out of the memmap, not the matrix
+            self._alive[rows] = False
+            self._unindex_metadata({r: json.loads(m) for r, m in found})
+            docstore = self._writable_docstore()
+            docstore.executemany("DELETE FROM docs WHERE row = ?", [(r,) for r in rows])
+            docstore.commit()
+        return True
+
+    # --- Reading ---
+    def _documents_for_rows(self, rows: List[int]) -> List[Document]:
+        found = {
+            row: Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+            for row, doc_id, text, metadata in self._select_in(
+                "SELECT row, id, text, metadata FROM docs WHERE row IN ({})", rows
+            )
+        }
+        return [found[r] for r in rows]
+
+    def get_by_ids(self, ids, /) -> List[Document]:
+        rows = [r for (r,) in self._select_in("SELECT row FROM docs WHERE id IN ({})", list(ids))]
+        return self._documents_for_rows(rows) if rows else []
+
+    def _filter_rows(self, filter: Dict[str, Any]) -> np.ndarray:
+        """{"source": "history", "year": [2023, 2024]} -> sorted ids of live matching rows.
+        AND across keys, OR within a list: set operations on the sorted row arrays, no per-row mask."""
+        if self._attributes is None:
+            self._build_attribute_index()
+        per_key = []
+        for key, wanted in filter.items():
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            arrays = [self._rows_with(key, value) for value in values]
+            per_key.append(arrays[0] if len(arrays) == 1 else np.unique(np.concatenate(arrays)))
+        per_key.sort(key=len)  # Intersect starting from the smallest
+        rows = per_key[0]
+        for other in per_key[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows[self._alive[rows]]
+
+    def _rows_with(self, key: str, value: Any) -> np.ndarray:
+        rows = self._row_arrays.get((key, value))
+        if rows is None:
+            row_set = self._attributes.get(key, {}).get(value, set())
+            rows = np.sort(np.fromiter(row_set, dtype=np.int64, count=len(row_set)))
+            self._row_arrays[(key, value)] = rows
+        return rows
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """(n_queries x n_docs) cosine scores, computed block by block with one matmul per block.
+        With `rows`, only those rows are gathered and scored: (n_queries x len(rows))."""
+        n = self._count if rows is None else len(rows)
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, self._SCAN_BLOCK):
+            stop = min(start + self._SCAN_BLOCK, n)
+            block = self._matrix[start:stop] if rows is None else self._matrix[rows[start:stop]]
+            scores[:, start:stop] = queries @ block.astype(np.float32, copy=False).T
+        if rows is None:
+            scores[:, ~self._alive[:self._count]] = -np.inf
+        return scores
+
+    def _filtered_scores(self, queries: np.ndarray, filter: Optional[Dict[str, Any]]):
+        """Returns (scores, rows): column j of `scores` is store row rows[j] (rows=None: column j IS row j)."""
+        if not filter:
+            return self._scores(queries), None
+        rows = self._filter_rows(filter)
+        if len(rows) < self._GATHER_RATIO * self._count:
+            return self._scores(queries, rows), rows  # Selective filter: score only the matching rows
+        scores = self._scores(queries)  # Broad filter: one contiguous scan is cheaper than a gather
+        mask = np.zeros(self._count, dtype=bool)  # A full-size mask only where the scan is full-size anyway
+        mask[rows] = True
+        scores[:, ~mask] = -np.inf
+        return scores, None
+
+    def _top_k(self, scores: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in scores]
+        # argpartition finds the k best in O(n); only those k get sorted.
+        candidates = np.argpartition(scores, -k, axis=1)[:, -k:]
+        results = []
+        for row_scores, cand in zip(scores, candidates):
+            order = cand[np.argsort(-row_scores[cand])]
+            order = order[np.isfinite(row_scores[order])]
+            results.append((order, row_scores[order]))
+        return results
+
+    def batch_similarity_search_with_score_by_vector(
+        self, embeddings: List[List[float]], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """Many queries at once: one (n_queries x dim) @ (dim x n_docs) matmul instead of n_queries."""
+        if self._count == 0:
+            return [[] for _ in embeddings]
+        queries = np.asarray(embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores, row_ids = self._filtered_scores(queries, filter)
+        results = []
+        for rows, scores in self._top_k(scores, k):
+            if row_ids is not None:
+                rows = row_ids[rows]
+            docs = self._documents_for_rows(rows.tolist()) if len(rows) else []
+            results.append(list(zip(docs, scores.tolist())))
+        return results
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        return self.batch_similarity_search_with_score_by_vector([embedding], k, filter)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        # Note: unlike Chroma (distance, lower = closer), this score is cosine SIMILARITY (higher = closer).
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Maps cosine similarity [-1, 1] to the [0, 1] relevance scale used by as_retriever(score_threshold=...).
+        return lambda score: (score + 1.0) / 2.0
+
+    # --- Persistence ---
+    def persist(self, persist_directory: Optional[str] = None):
+        path = persist_directory or self.persist_directory
+        os.makedirs(path, exist_ok=True)
+        if self._matrix is None:  # Nothing added yet: persist an empty index
+            matrix, alive = np.zeros((0, 0), dtype=self.dtype), np.zeros(0, dtype=bool)
+        else:
+            matrix, alive = self._matrix[:self._count], self._alive[:self._count]
+        # Write to temp files, then atomically swap: processes that already mapped the old file keep working.
+        for name, array in (("vectors.npy", matrix), ("alive.npy", alive)):
+            tmp = os.path.join(path, name + ".tmp")
+            np.save(tmp, array)
+            os.replace(tmp + ".npy", os.path.join(path, name))
+        tmp_db = os.path.join(path, "docstore.sqlite.tmp")
+        if os.path.exists(tmp_db):
+            os.remove(tmp_db)
+        disk = sqlite3.connect(tmp_db)
+        self._docstore.backup(disk)
+        disk.close()
+        os.replace(tmp_db, os.path.join(path, "docstore.sqlite"))
+
+    @classmethod
+    def load(cls, persist_directory: str, embedding: Embeddings) -> "NumpyVectorStore":
+        """Opens instantly: vectors are memory-mapped, not read. Pages load on first touch."""
+        vectors = np.load(os.path.join(persist_directory, "vectors.npy"), mmap_mode="r")
+        store = cls(embedding, dtype=vectors.dtype, persist_directory=persist_directory)
+        if len(vectors):  # An empty persisted store stays unallocated: its dim is only known on the first add
+            store._matrix = vectors
+            store._alive = np.load(os.path.join(persist_directory, "alive.npy"), mmap_mode="r")
+        store._count = len(vectors)
+        store._attributes = None  # Rebuilt from the docstore on the first filtered query
+        # Read-only: add_texts()/delete() copy it into memory first, so only persist() changes the files on disk.
+        docstore_uri = "file:" + quote(os.path.abspath(os.path.join(persist_directory, "docstore.sqlite"))) + "?mode=ro"
+        store._docstore = sqlite3.connect(docstore_uri, uri=True, check_same_thread=False)
+        store._docstore_on_disk = True
+        return store
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+
+def demonstrate_numpy_vector_store():
+    documents = [
+        Document(page_content="LangChain was launched in October 2022 by Harrison Chase.", metadata={"source": "history"}),
+        Document(page_content="LangGraph allows creating cyclic agentic workflows.", metadata={"source": "features"}),
+        Document(page_content="Apples are a type of fruit that grow on trees.", metadata={"source": "general_knowledge"}),
+    ]
+
+    print("--- 1. Same API as Chroma ---")
+    try:
+        vector_store = NumpyVectorStore.from_documents(documents, OpenAIEmbeddings(model="text-embedding-3-small"))
+        print(f"Found Doc: {vector_store.similarity_search('Who created LangChain?', k=1)[0].page_content}")
+        for doc, score in vector_store.similarity_search_with_score("fruit", k=1):
+            print(f"Content: {doc.page_content} | Cosine Similarity: {score:.3f}")
+        retriever = vector_store.as_retriever(search_kwargs={"k": 1})
+        print(f"Retriever: {retriever.invoke('cyclic workflows')[0].page_content}")
+        filtered = vector_store.similarity_search("Who created LangChain?", k=1, filter={"source": "general_knowledge"})
+        print(f"Filtered (source=general_knowledge): {filtered[0].page_content}")
+    except Exception as e:
+        print(f"Skipping live demo (requires valid OpenAI Key): {e}")
+
+    benchmark_numpy_vector_store()
+    benchmark_filtered_search()
+
+
+def benchmark_numpy_vector_store(n_docs: int = 200_000, dim: int = 384, n_queries: int = 64):
+    print(f"\n--- 2. Benchmark: {n_docs:,} x {dim} vectors ---")
+    rng = np.random.default_rng(0)
+    fake_embeddings = DeterministicFakeEmbedding(size=dim)
+    path = os.path.join(tempfile.gettempdir(), "numpy_vector_store_bench")
+
+    for dtype in (np.float32, np.float16):
+        store = NumpyVectorStore(fake_embeddings, dtype=dtype)
+        vectors = rng.standard_normal((n_docs, dim), dtype=np.float32)
+        store.add_embeddings([f"doc {i}" for i in range(n_docs)], vectors, ids=[str(i) for i in range(n_docs)])
+        queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+
+        start = time.perf_counter()
+        for q in queries:
+            store.similarity_search_with_score_by_vector(q, k=10)
+        single_qps = n_queries / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        store.batch_similarity_search_with_score_by_vector(queries, k=10)
+        batch_qps = n_queries / (time.perf_counter() - start)
+
+        store.persist(path)
+        start = time.perf_counter()
+        reopened = NumpyVectorStore.load(path, fake_embeddings)
+        open_ms = (time.perf_counter() - start) * 1000
+        assert reopened.similarity_search_with_score_by_vector(queries[0], k=1)[0][0].id == \
+            store.similarity_search_with_score_by_vector(queries[0], k=1)[0][0].id
+
+        print(f"{np.dtype(dtype).name}: {store._matrix[:n_docs].nbytes / 1e6:.0f} MB | "
+              f"{single_qps:.0f} QPS one-by-one | {batch_qps:.0f} QPS batched | open from disk: {open_ms:.1f}ms")
+        del reopened
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def benchmark_filtered_search(n_docs: int = 200_000, dim: int = 384, n_queries: int = 64, k: int = 10):
+    print(f"\n--- 3. Benchmark: Filtered search, {n_docs:,} x {dim} vectors, k={k} ---")
+    rng = np.random.default_rng(0)
+    store = NumpyVectorStore(DeterministicFakeEmbedding(size=dim))
+    metadatas = [{"tenant": f"t{i % 1000}", "lang": "en" if i % 2 else "de"} for i in range(n_docs)]
+    vectors = rng.standard_normal((n_docs, dim), dtype=np.float32)
+    store.add_embeddings([f"doc {i}" for i in range(n_docs)], vectors, metadatas, ids=[str(i) for i in range(n_docs)])
+    queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+
+    start = time.perf_counter()
+    for q in queries:
+        store.similarity_search_with_score_by_vector(q, k=k)
+    print(f"No filter:                {(time.perf_counter() - start) * 1000 / n_queries:6.2f}ms/query")
+
+    for filter in ({"lang": "en"}, {"tenant": "t7"}):
+        # Post-filter: search, then drop non-matching hits. Wasted work AND fewer than k results.
+        start = time.perf_counter()
+        kept = [sum(doc.metadata[key] == value for doc, _ in store.similarity_search_with_score_by_vector(q, k=k)
+                    for key, value in filter.items()) for q in queries]
+        post_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+        start = time.perf_counter()
+        results = [store.similarity_search_with_score_by_vector(q, k=k, filter=filter) for q in queries]
+        pre_ms = (time.perf_counter() - start) * 1000 / n_queries
+        print(f"{str(filter):<25} post-filter {post_ms:6.2f}ms/query, {np.mean(kept):4.1f} results | "
+              f"pre-filter {pre_ms:6.2f}ms/query, {np.mean([len(r) for r in results]):4.1f} results")
+
+if __name__ == "__main__":
+    demonstrate_numpy_vector_store()
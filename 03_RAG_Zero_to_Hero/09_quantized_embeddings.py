@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import time
+from typing import List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Concept: Quantization + Re-scoring ---
+# text-embedding-3-small = 1536 float32 = 6KB per chunk. 10M chunks = 61GB of RAM.
+# Trick used by every large-scale vector DB:
+# 1. Keep a COMPACT copy in RAM:
+#      int8   -> 1 byte per dimension  (4x smaller)
+#      binary -> 1 bit per dimension   (32x smaller)
+# 2. First pass: search the compact codes, keep the top (k x oversample) candidates.
+# 3. Second pass: load ONLY those candidates' float32 vectors from disk and re-score exactly.
+# Result: RAM of the compact codes, recall close to full precision.
+
+# Number of 1-bits for every byte value. NumPy 2.0+ has a native np.bitwise_count; older versions use this table.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return _POPCOUNT[x]
+
+class QuantizedIndex:
+    _SCAN_BLOCK = 65_536
+
+    def __init__(self, directory: str, mode: str = "int8"):
+        if mode not in ("int8", "binary"):
+            raise ValueError("mode must be 'int8' or 'binary'")
+        self.directory = directory
+        self.mode = mode
+        self.codes = None    # In RAM: int8 (n x dim) or packed bits (n x dim/8)
+        self.scale = None    # int8 only: per-dimension scale factor
+        self.full = None     # On disk: memory-mapped float32 (n x dim), only touched for re-scoring
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, directory: str, mode: str = "int8") -> "QuantizedIndex":
+        index = cls(directory, mode)
+        os.makedirs(directory, exist_ok=True)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        # Full precision goes to disk, written through a memmap so we never hold two copies.
+        full = np.lib.format.open_memmap(os.path.join(directory, "full.npy"), mode="w+",
+                                         dtype=np.float32, shape=vectors.shape)
+        full[:] = vectors
+        full.flush()
+        del full
+        index.full = np.load(os.path.join(directory, "full.npy"), mmap_mode="r")
+
+        if mode == "int8":
+            # Symmetric per-dimension scalar quantization: x ~ code * scale, code in [-127, 127].
+            index.scale = np.maximum(np.abs(vectors).max(axis=0), 1e-12) / 127.0
+            index.codes = np.clip(np.rint(vectors / index.scale), -127, 127).astype(np.int8)
+        else:
+            # 1 bit per dimension: sign of each component. Similarity ~ -(Hamming distance).
+            index.codes = np.packbits(vectors > 0, axis=1)
+        np.save(os.path.join(directory, "codes.npy"), index.codes)
+        if index.scale is not None:
+            np.save(os.path.join(directory, "scale.npy"), index.scale)
+        return index
+
+    @classmethod
+    def load(cls, directory: str) -> "QuantizedIndex":
+        """Reopens a built index: codes are read into RAM, full precision stays memory-mapped. No re-quantizing."""
+        codes = np.load(os.path.join(directory, "codes.npy"))
+        index = cls(directory, mode="int8" if codes.dtype == np.int8 else "binary")
+        index.codes = codes
+        if index.mode == "int8":
+            index.scale = np.load(os.path.join(directory, "scale.npy"))
+        index.full = np.load(os.path.join(directory, "full.npy"), mmap_mode="r")
+        return index
+
+    @property
+    def ram_bytes(self) -> int:
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def _approx_scores(self, queries: np.ndarray) -> np.ndarray:
+        n = len(self.codes)
+        if self.mode == "int8":
+            # codes @ (scale * q) == dequantized(codes) @ q, without materializing float vectors for all rows.
+            scaled = (queries * self.scale).astype(np.float32)
+            scores = np.empty((len(queries), n), dtype=np.float32)
+            for start in range(0, n, self._SCAN_BLOCK):
+                block = self.codes[start:start + self._SCAN_BLOCK].astype(np.float32)
+                scores[:, start:start + len(block)] = scaled @ block.T
+            return scores
+        query_bits = np.packbits(queries > 0, axis=1)
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        for i, bits in enumerate(query_bits):
+            hamming = _popcount(np.bitwise_xor(self.codes, bits)).sum(axis=1, dtype=np.uint32)
+            scores[i] = -hamming.astype(np.float32)
+        return scores
+
+    def search(self, queries: np.ndarray, k: int = 10, rescore: bool = True, oversample: int = 4) -> List[Tuple[np.ndarray, np.ndarray]]:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        approx = self._approx_scores(queries)
+
+        n_candidates = min(k * oversample if rescore else k, approx.shape[1])
+        candidates = np.argpartition(approx, -n_candidates, axis=1)[:, -n_candidates:]
+
+        results = []
+        for query, cand, row_scores in zip(queries, candidates, approx):
+            if rescore:
+                cand = np.sort(cand)  # Ascending row order = mostly sequential disk reads
+                exact = self.full[cand] @ query
+                top = np.argsort(-exact)[:k]
+                results.append((cand[top], exact[top]))
+            else:
+                top = np.argsort(-row_scores[cand])[:k]
+                results.append((cand[top], row_scores[cand][top]))
+        return results
+
+
+def _clustered_vectors(rng, centers: np.ndarray, n: int) -> np.ndarray:
+    # Real embeddings are clustered by topic; uniform random data would make every method look bad.
+    noise = 0.5 * rng.standard_normal((n, centers.shape[1]), dtype=np.float32)
+    return centers[rng.integers(0, len(centers), n)] + noise
+
+
+def benchmark_quantization(n_docs: int = 100_000, dim: int = 384, n_queries: int = 100, k: int = 10):
+    print(f"--- Benchmark: {n_docs:,} x {dim} vectors, recall@{k} vs exact float32 ---")
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((n_docs // 50, dim), dtype=np.float32)
+    vectors = _clustered_vectors(rng, centers, n_docs)
+    queries = _clustered_vectors(rng, centers, n_queries)
+
+    # Ground truth: exact float32 search.
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q_normed = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    start = time.perf_counter()
+    exact_scores = q_normed @ normed.T
+    truth = np.argpartition(exact_scores, -k, axis=1)[:, -k:]
+    exact_qps = n_queries / (time.perf_counter() - start)
+    print(f"{'float32 (exact)':<22} RAM {normed.nbytes / 1e6:7.1f} MB | {exact_qps:8.0f} QPS | recall 1.000")
+
+    directory = os.path.join(tempfile.gettempdir(), "quantized_index_bench")
+    for mode in ("int8", "binary"):
+        index = QuantizedIndex.build(vectors, os.path.join(directory, mode), mode=mode)
+        for rescore, oversample in ((False, 1), (True, 4), (True, 20)):
+            start = time.perf_counter()
+            results = index.search(queries, k=k, rescore=rescore, oversample=oversample)
+            qps = n_queries / (time.perf_counter() - start)
+            recall = np.mean([len(set(rows) & set(t)) / k for (rows, _), t in zip(results, truth)])
+            label = f"{mode} + rescore x{oversample}" if rescore else f"{mode} (codes only)"
+            print(f"{label:<22} RAM {index.ram_bytes / 1e6:7.1f} MB | {qps:8.0f} QPS | recall {recall:.3f}")
+
+        # Restart: reopen from disk instead of re-quantizing the float32 corpus.
+        start = time.perf_counter()
+        reopened = QuantizedIndex.load(os.path.join(directory, mode))
+        open_ms = (time.perf_counter() - start) * 1000
+        same = all(np.array_equal(a, b) for (a, _), (b, _) in zip(reopened.search(queries[:5], k=k),
+                                                                   index.search(queries[:5], k=k)))
+        print(f"{mode} reopened from disk in {open_ms:.1f}ms, same results: {same}")
+        del index, reopened
+    shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    benchmark_quantization()
@@ -0,0 +1,273 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import uuid
+import zlib
+from collections import Counter, defaultdict
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Concept: An Inverted Index on Disk ---
+# BM25Retriever.from_documents(docs) tokenizes the WHOLE corpus in RAM on every start,
+# and you cannot add a document without rebuilding it.
+# A search engine (Lucene, Tantivy) instead keeps an INVERTED INDEX on disk:
+#   term -> postings list [(doc_id, term_freq, doc_len), ...]   (delta-encoded + zlib-compressed)
+# plus corpus statistics (N docs, total length, document frequency per term).
+# A query only reads the postings of ITS terms. Startup = opening a file.
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _encode_postings(doc_ids: np.ndarray, tfs: np.ndarray, lengths: np.ndarray) -> bytes:
+    # Sorted doc ids become small gaps ("deltas"), which zlib compresses very well.
+    deltas = np.diff(doc_ids, prepend=0)
+    return zlib.compress(np.concatenate([deltas, tfs, lengths]).astype(np.uint32).tobytes(), 1)
+
+def _decode_postings(blob: bytes):
+    arr = np.frombuffer(zlib.decompress(blob), dtype=np.uint32)
+    n = len(arr) // 3
+    return np.cumsum(arr[:n], dtype=np.int64), arr[n:2 * n].astype(np.float32), arr[2 * n:].astype(np.float32)
+
+
+class PersistentBM25Index:
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            -- AUTOINCREMENT: a deleted doc_id is never handed out again (it may still be in tombstones/postings).
+            CREATE TABLE IF NOT EXISTS docs (doc_id INTEGER PRIMARY KEY AUTOINCREMENT, ext_id TEXT UNIQUE, length INTEGER, text TEXT, metadata TEXT);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT PRIMARY KEY, df INTEGER, blob BLOB);
+            CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER);
+            CREATE TABLE IF NOT EXISTS tombstones (doc_id INTEGER PRIMARY KEY);
+        """)
+        # Everything we keep in RAM: two numbers and the (usually tiny) set of deleted-but-not-compacted ids.
+        stats = dict(self._conn.execute("SELECT key, value FROM stats"))
+        self.n_docs = stats.get("n_docs", 0)
+        self.total_length = stats.get("total_length", 0)
+        self._tombstones = np.array([r for (r,) in self._conn.execute("SELECT doc_id FROM tombstones")], dtype=np.int64)
+
+    def _save_stats(self):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)",
+            [("n_docs", self.n_docs), ("total_length", self.total_length)],
+        )
+
+    # --- Writes ---
+    def add_documents(self, docs: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """Adds a batch. Each touched postings list is rewritten ONCE per batch, so add in batches.
+        An existing id is replaced (upsert): the old row is tombstoned, the new one gets a fresh doc_id."""
+        ids = ids or [doc.id or str(uuid.uuid4()) for doc in docs]
+        batch = dict(zip(ids, docs))  # Same id twice in one batch: the last one wins
+        new_postings = defaultdict(list)
+        with self._conn:
+            self._delete(list(batch))
+            for ext_id, doc in batch.items():
+                tokens = tokenize(doc.page_content)
+                cursor = self._conn.execute(
+                    "INSERT INTO docs (ext_id, length, text, metadata) VALUES (?, ?, ?, ?)",
+                    (ext_id, len(tokens), doc.page_content, json.dumps(doc.metadata)),
+                )
+                for term, tf in Counter(tokens).items():
+                    new_postings[term].append((cursor.lastrowid, tf, len(tokens)))
+                self.n_docs += 1
+                self.total_length += len(tokens)
+
+            for term, rows in new_postings.items():
+                added = np.array(rows, dtype=np.int64).T
+                row = self._conn.execute("SELECT df, blob FROM postings WHERE term = ?", (term,)).fetchone()
+                if row:
+                    # New doc ids are always larger, so appending keeps the list sorted.
+                    old_ids, old_tfs, old_lens = _decode_postings(row[1])
+                    blob = _encode_postings(np.concatenate([old_ids, added[0]]),
+                                            np.concatenate([old_tfs, added[1]]),
+                                            np.concatenate([old_lens, added[2]]))
+                    df = row[0] + len(rows)
+                else:
+                    blob, df = _encode_postings(added[0], added[1], added[2]), len(rows)
+                self._conn.execute("INSERT OR REPLACE INTO postings (term, df, blob) VALUES (?, ?, ?)", (term, df, blob))
+            self._save_stats()
+        return ids
+
+    def delete(self, ids: List[str]):
+        """Statistics are corrected immediately; postings are purged later by compact()."""
+        with self._conn:
+            self._delete(ids)
+            self._save_stats()
+
+    def _delete(self, ids: List[str]):
+        # Runs inside the caller's transaction.
+        for ext_id in ids:
+            row = self._conn.execute("SELECT doc_id, length, text FROM docs WHERE ext_id = ?", (ext_id,)).fetchone()
+            if not row:
+                continue
+            doc_id, length, text = row
+            self._conn.executemany("UPDATE postings SET df = df - 1 WHERE term = ?", [(t,) for t in set(tokenize(text))])
+            self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+            self._conn.execute("INSERT INTO tombstones (doc_id) VALUES (?)", (doc_id,))
+            self.n_docs -= 1
+            self.total_length -= length
+            self._tombstones = np.append(self._tombstones, doc_id)
+
+    def compact(self):
+        """Rewrites only the postings lists that still reference deleted docs."""
+        if not len(self._tombstones):
+            return
+        with self._conn:
+            for term, blob in self._conn.execute("SELECT term, blob FROM postings").fetchall():
+                doc_ids, tfs, lens = _decode_postings(blob)
+                keep = ~np.isin(doc_ids, self._tombstones)
+                if keep.all():
+                    continue
+                if keep.any():
+                    self._conn.execute("UPDATE postings SET blob = ? WHERE term = ?",
+                                       (_encode_postings(doc_ids[keep], tfs[keep], lens[keep]), term))
+                else:
+                    self._conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+            self._conn.execute("DELETE FROM tombstones")
+        self._tombstones = np.array([], dtype=np.int64)
+
+    # --- Reads ---
+    def search(self, query: str, k: int = 4) -> List[tuple]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.n_docs:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        rows = self._conn.execute(f"SELECT df, blob FROM postings WHERE term IN ({placeholders})", terms).fetchall()
+        if not rows:
+            return []
+
+        avgdl = self.total_length / self.n_docs
+        all_ids, all_scores = [], []
+        for df, blob in rows:
+            doc_ids, tfs, lens = _decode_postings(blob)
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            # BM25 for every posting of this term at once: no Python loop over documents.
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * lens / avgdl)))
+            all_ids.append(doc_ids)
+
+        # Sparse accumulation: only docs containing at least one query term get a score.
+        doc_ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        if len(self._tombstones):
+            scores[np.isin(doc_ids, self._tombstones)] = -np.inf
+
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:]          # O(candidates), no full sort
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+
+        found = {
+            doc_id: (ext_id, text, metadata)
+            for doc_id, ext_id, text, metadata in self._conn.execute(
+                f"SELECT doc_id, ext_id, text, metadata FROM docs WHERE doc_id IN ({','.join('?' * len(top))})",
+                [int(doc_ids[i]) for i in top],
+            )
+        }
+        results = []
+        for i in top:
+            ext_id, text, metadata = found[int(doc_ids[i])]
+            results.append((Document(id=ext_id, page_content=text, metadata=json.loads(metadata)), float(scores[i])))
+        return results
+
+    def close(self):
+        self._conn.close()
+
+
+class PersistentBM25Retriever(BaseRetriever):
+    """Drop-in for BM25Retriever (works inside EnsembleRetriever)."""
+    index: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.index.search(query, k=self.k)]
+
+
+def demonstrate_persistent_bm25():
+    path = os.path.join(tempfile.gettempdir(), "bm25_demo.sqlite")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    print("--- 1. Build + Incremental Add ---")
+    index = PersistentBM25Index(path)
+    texts = [
+        "LangChain is a framework for LLMs.",
+        "Apples are red fruits.",
+        "LangGraph is for agentic workflows.",
+        "Bananas are yellow.",
+    ]
+    index.add_documents([Document(page_content=t) for t in texts], ids=[f"doc-{i}" for i in range(len(texts))])
+    index.add_documents([Document(page_content="LangSmith traces LangChain apps.")], ids=["doc-new"])
+    retriever = PersistentBM25Retriever(index=index, k=2)
+    for doc in retriever.invoke("LangChain framework"):
+        print(f"- [{doc.id}] {doc.page_content}")
+
+    print("\n--- 2. Delete ---")
+    index.delete(["doc-0"])
+    for doc in retriever.invoke("LangChain framework"):
+        print(f"- [{doc.id}] {doc.page_content}")
+    index.compact()
+    index.close()
+
+    benchmark_persistent_bm25()
+
+
+def benchmark_persistent_bm25(n_docs: int = 200_000, vocab_size: int = 50_000, batch_size: int = 50_000):
+    print(f"\n--- 3. Benchmark: {n_docs:,} synthetic docs ---")
+    rng = np.random.default_rng(0)
+    # Zipf-distributed words, like real text: a few very common terms, a long tail of rare ones.
+    vocab = np.array([f"w{i}" for i in range(vocab_size)])
+    word_ids = np.minimum(rng.zipf(1.2, size=(n_docs, 30)), vocab_size) - 1
+    docs = [Document(page_content=" ".join(vocab[row])) for row in word_ids]
+    queries = [" ".join(vocab[rng.integers(0, 2000, 3)]) for _ in range(100)]
+
+    path = os.path.join(tempfile.gettempdir(), "bm25_bench.sqlite")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    start = time.perf_counter()
+    index = PersistentBM25Index(path)
+    for i in range(0, n_docs, batch_size):
+        index.add_documents(docs[i:i + batch_size], ids=[str(j) for j in range(i, min(i + batch_size, n_docs))])
+    index.close()
+    print(f"Persistent: built in {time.perf_counter() - start:.1f}s, {os.path.getsize(path) / 1e6:.0f} MB on disk")
+
+    start = time.perf_counter()
+    index = PersistentBM25Index(path)
+    print(f"Persistent: opened in {(time.perf_counter() - start) * 1000:.1f}ms")
+    start = time.perf_counter()
+    for q in queries:
+        index.search(q, k=10)
+    print(f"Persistent: {(time.perf_counter() - start) / len(queries) * 1000:.1f}ms per query")
+    index.close()
+
+    try:
+        from langchain_community.retrievers import BM25Retriever
+        start = time.perf_counter()
+        bm25 = BM25Retriever.from_documents(docs, k=10)
+        print(f"BM25Retriever: built in RAM in {time.perf_counter() - start:.1f}s (on EVERY start)")
+        start = time.perf_counter()
+        for q in queries:
+            bm25.invoke(q)
+        print(f"BM25Retriever: {(time.perf_counter() - start) / len(queries) * 1000:.1f}ms per query")
+    except ImportError as e:
+        print(f"Skipping BM25Retriever comparison (pip install rank_bm25): {e}")
+
+if __name__ == "__main__":
+    demonstrate_persistent_bm25()
@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.retrievers import EnsembleRetriever
+from langchain_chroma import Chroma
+from langchain_community.retrievers import BM25Retriever
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr, model_validator
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Concept: Fan-out, Deadline, Fuse ---
+# EnsembleRetriever calls BM25, THEN Chroma. Latency = bm25 + vector.
+# Both are independent, so:
+# 1. FAN-OUT: start every sub-retriever at the same time (threads or asyncio).
+# 2. DEADLINE: each retriever gets a time budget. If it misses it, we answer without it.
+# 3. FUSE: Reciprocal Rank Fusion, score(doc) = sum_i weight_i / (c + rank_i),
+#    computed on a (n_retrievers x n_unique_docs) rank matrix instead of Python dicts.
+# Latency = the slowest retriever that made its deadline, never more than the largest deadline.
+# 4. SHED LOAD: a thread can't be killed, so a timed-out call keeps its pool worker until it returns.
+#    Once a retriever has `max_stragglers` such calls still running, it is skipped until they finish,
+#    so one hung backend can't fill the shared pool and time out every other query.
+
+# Shared pool: retrievers are I/O bound (HTTP to a vector DB), so threads are fine.
+_FAN_OUT_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hybrid-retriever")
+
+def _doc_key(doc: Document) -> str:
+    return doc.id or hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(doc_lists: List[Optional[List[Document]]], weights: List[float], c: int = 60) -> List[Document]:
+    """Weighted RRF over an array rank table. `None` in doc_lists = retriever missed its deadline."""
+    key_to_col, unique_docs = {}, []
+    for docs in doc_lists:
+        for doc in docs or []:
+            if _doc_key(doc) not in key_to_col:
+                key_to_col[_doc_key(doc)] = len(unique_docs)
+                unique_docs.append(doc)
+    if not unique_docs:
+        return []
+
+    # ranks[i, j] = rank of doc j in retriever i (1-based), inf if retriever i did not return it.
+    ranks = np.full((len(doc_lists), len(unique_docs)), np.inf)
+    for i, docs in enumerate(doc_lists):
+        for rank, doc in enumerate(docs or [], start=1):
+            col = key_to_col[_doc_key(doc)]
+            ranks[i, col] = min(ranks[i, col], rank)
+
+    # 1 / (c + inf) == 0, so missing docs (and timed-out retrievers) contribute nothing.
+    scores = (np.asarray(weights, dtype=float)[:, None] / (c + ranks)).sum(axis=0)
+    order = np.argsort(-scores, kind="stable")
+    return [unique_docs[j] for j in order]
+
+
+class ParallelEnsembleRetriever(BaseRetriever):
+    """EnsembleRetriever with concurrent sub-retrievers, per-retriever deadlines and vectorized RRF."""
+    retrievers: List[BaseRetriever]
+    weights: List[float]
+    timeouts: Optional[List[float]] = None  # Seconds per retriever. None = wait forever
+    c: int = 60
+    k: Optional[int] = None  # Truncate the fused list
+    max_stragglers: int = 4  # Timed-out calls still running per retriever before it is skipped
+    _stragglers: Dict[int, int] = PrivateAttr(default_factory=dict)
+    _stragglers_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @model_validator(mode="after")
+    def _check_lengths(self):
+        if len(self.weights) != len(self.retrievers):
+            raise ValueError(f"Got {len(self.weights)} weights for {len(self.retrievers)} retrievers")
+        if self.timeouts is not None and len(self.timeouts) != len(self.retrievers):
+            raise ValueError(f"Got {len(self.timeouts)} timeouts for {len(self.retrievers)} retrievers")
+        return self
+
+    def _deadlines(self) -> List[Optional[float]]:
+        return self.timeouts or [None] * len(self.retrievers)
+
+    def _fuse(self, results: List[Optional[List[Document]]]) -> List[Document]:
+        fused = reciprocal_rank_fusion(results, self.weights, self.c)
+        return fused[:self.k] if self.k else fused
+
+    def _track_straggler(self, i: int, future):
+        with self._stragglers_lock:
+            self._stragglers[i] = self._stragglers.get(i, 0) + 1
+
+        def finished(_):
+            with self._stragglers_lock:
+                self._stragglers[i] -= 1
+        future.add_done_callback(finished)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        start = time.monotonic()
+        futures = []
+        for i, r in enumerate(self.retrievers):
+            with self._stragglers_lock:
+                shed = self._stragglers.get(i, 0) >= self.max_stragglers
+            if shed:
+                logger.warning("retriever_%d skipped: %d timed-out calls still running", i + 1, self.max_stragglers)
+                futures.append(None)
+            else:
+                futures.append(_FAN_OUT_POOL.submit(
+                    r.invoke, query, {"callbacks": run_manager.get_child(tag=f"retriever_{i + 1}")}))
+        results = []
+        for i, (future, deadline) in enumerate(zip(futures, self._deadlines())):
+            if future is None:
+                results.append(None)
+                continue
+            # Deadlines are measured from the fan-out, not from when we start waiting on this future.
+            remaining = None if deadline is None else max(0.0, deadline - (time.monotonic() - start))
+            try:
+                results.append(future.result(timeout=remaining))
+            except Exception as e:  # TimeoutError or the retriever itself failed
+                if not future.cancel() and not future.done():
+                    self._track_straggler(i, future)  # Still running: it holds a pool worker
+                logger.warning("retriever_%d dropped from fusion: %r", i + 1, e)
+                results.append(None)
+        return self._fuse(results)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        async def call(i, retriever, deadline):
+            try:
+                return await asyncio.wait_for(
+                    retriever.ainvoke(query, {"callbacks": run_manager.get_child(tag=f"retriever_{i + 1}")}),
+                    timeout=deadline,
+                )
+            except Exception as e:
+                logger.warning("retriever_%d dropped from fusion: %r", i + 1, e)
+                return None
+
+        results = await asyncio.gather(
+            *(call(i, r, d) for i, (r, d) in enumerate(zip(self.retrievers, self._deadlines())))
+        )
+        return self._fuse(list(results))
+
+
+class SlowRetriever(BaseRetriever):
+    """Wraps a retriever and adds network latency, to make the benchmark realistic."""
+    retriever: BaseRetriever
+    delay: float
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        time.sleep(self.delay)
+        return self.retriever.invoke(query)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        await asyncio.sleep(self.delay)
+        return await self.retriever.ainvoke(query)
+
+
+def demonstrate_parallel_hybrid():
+    texts = [
+        "LangChain is a framework for LLMs.",
+        "Apples are red fruits.",
+        "LangGraph is for agentic workflows.",
+        "Bananas are yellow.",
+    ]
+    docs = [Document(page_content=t) for t in texts]
+    bm25_retriever = BM25Retriever.from_documents(docs, k=2)
+    # Offline stand-in. In production: OpenAIEmbeddings()
+    vectorstore = Chroma.from_documents(docs, DeterministicFakeEmbedding(size=256), collection_name="parallel_hybrid")
+    chroma_retriever = vectorstore.as_retriever(search_kwargs={"k": 2})
+
+    # Simulated latencies: keyword search 150ms, vector DB 300ms.
+    bm25_slow = SlowRetriever(retriever=bm25_retriever, delay=0.15)
+    chroma_slow = SlowRetriever(retriever=chroma_retriever, delay=0.30)
+    query = "LangChain framework"
+
+    print("--- 1. EnsembleRetriever (sequential) ---")
+    start = time.perf_counter()
+    EnsembleRetriever(retrievers=[bm25_slow, chroma_slow], weights=[0.5, 0.5]).invoke(query)
+    print(f"Latency: {(time.perf_counter() - start) * 1000:.0f}ms (~ sum of both)")
+
+    print("\n--- 2. ParallelEnsembleRetriever ---")
+    parallel = ParallelEnsembleRetriever(retrievers=[bm25_slow, chroma_slow], weights=[0.5, 0.5])
+    start = time.perf_counter()
+    results = parallel.invoke(query)
+    print(f"Latency: {(time.perf_counter() - start) * 1000:.0f}ms (~ the slowest one)")
+    for i, doc in enumerate(results):
+        print(f"{i + 1}. {doc.page_content}")
+
+    print("\n--- 3. Deadline: vector DB gets only 200ms ---")
+    degraded = ParallelEnsembleRetriever(retrievers=[bm25_slow, chroma_slow], weights=[0.5, 0.5], timeouts=[1.0, 0.2])
+    start = time.perf_counter()
+    results = degraded.invoke(query)
+    print(f"Latency: {(time.perf_counter() - start) * 1000:.0f}ms, answered with keyword results only:")
+    for i, doc in enumerate(results):
+        print(f"{i + 1}. {doc.page_content}")
+
+    print("\n--- 4. Async ---")
+    start = time.perf_counter()
+    asyncio.run(parallel.ainvoke(query))
+    print(f"Latency: {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    vectorstore.delete_collection()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    demonstrate_parallel_hybrid()
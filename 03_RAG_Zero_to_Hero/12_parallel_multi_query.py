@@ -0,0 +1,227 @@
+import hashlib
+import json
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List
+
+from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain_chroma import Chroma
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
+from langchain_core.vectorstores import VectorStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Concept: Hide the Cost of Query Expansion ---
+# MultiQueryRetriever does: LLM writes 3 variants (wait) -> search #1 -> search #2 -> search #3.
+# Every step waits for the previous one, and each search makes its own embedding call.
+# Better:
+# 1. Search the ORIGINAL query immediately (t=0), while the LLM is still thinking.
+# 2. STREAM the LLM output; each finished line is a variant and goes straight to retrieval.
+# 3. Each variant is embedded with embed_query and searched concurrently in a thread pool.
+#    (Opt-in for symmetric embedders like OpenAI: variants ready at the same time share ONE embed_documents call.)
+# 4. Results are deduped by a stable document-id hash.
+
+QUERY_PROMPT = ChatPromptTemplate.from_template(
+    "You are an AI language model assistant. Your task is to generate 3 different versions "
+    "of the given user question to retrieve relevant documents from a vector database. "
+    "Provide these alternative questions separated by newlines.\nOriginal question: {question}"
+)
+
+_NUMBERING_RE = re.compile(r"^\s*(?:\d+[.)]|[-*])\s*")
+
+def stable_doc_id(doc: Document) -> str:
+    """Same document from two searches -> same id, without comparing whole page contents."""
+    if doc.id:
+        return doc.id
+    payload = doc.page_content + json.dumps(doc.metadata, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StreamingMultiQueryRetriever(BaseRetriever):
+    vectorstore: VectorStore
+    llm_chain: Runnable  # prompt | llm | StrOutputParser(), returns one variant per line
+    k: int = 4
+    include_original: bool = True
+    stream_variants: bool = True  # False = wait for all variants before searching any of them
+    # True = variants ready at the same time share one embed_documents call. Only for embedders that embed
+    # queries and documents the same way (OpenAI); E5/BGE/Cohere `input_type` need embed_query per variant.
+    batch_embed_queries: bool = False
+    max_concurrency: int = 8
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        pending: "queue.Queue[Any]" = queue.Queue()
+        done = object()
+        search_futures: List[Future] = []
+        worker_errors: List[BaseException] = []
+        search_pool = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+        def embed_and_search():
+            # Drains every variant that is ready right now and submits its searches.
+            finished = False
+            while not finished:
+                batch = [pending.get()]
+                while not pending.empty():
+                    batch.append(pending.get_nowait())
+                if done in batch:
+                    finished = True
+                    batch = [q for q in batch if q is not done]
+                if not batch or worker_errors:
+                    continue  # After an error: keep draining until `done`, so the caller never blocks
+                try:
+                    if self.batch_embed_queries:
+                        vectors = self.vectorstore.embeddings.embed_documents(batch)  # One call for the whole batch
+                        searches = [(v, self.vectorstore.similarity_search_by_vector, vector)
+                                    for v, vector in zip(batch, vectors)]
+                    else:
+                        searches = [(v, self._embed_and_search, v) for v in batch]  # embed_query runs in the pool
+                    for variant, search, arg in searches:
+                        run_manager.on_text(f"Searching variant: {variant}\n")
+                        search_futures.append(search_pool.submit(search, arg, self.k))
+                except Exception as e:
+                    worker_errors.append(e)  # Re-raised in the caller
+
+        worker = threading.Thread(target=embed_and_search, daemon=True)
+        worker.start()
+        try:
+            if self.include_original:
+                pending.put(query)  # Starts before the LLM has produced a single token
+
+            config = {"callbacks": run_manager.get_child()}
+            try:
+                if self.stream_variants:
+                    buffer = ""
+                    for chunk in self.llm_chain.stream({"question": query}, config):
+                        buffer += chunk
+                        *lines, buffer = buffer.split("\n")
+                        for line in lines:
+                            self._enqueue(line, pending)
+                    self._enqueue(buffer, pending)
+                else:
+                    for line in self.llm_chain.invoke({"question": query}, config).split("\n"):
+                        self._enqueue(line, pending)
+            finally:
+                pending.put(done)  # Even if the LLM failed: the worker must stop
+                worker.join()
+            if worker_errors:
+                raise worker_errors[0]
+
+            results, seen = [], set()
+            for future in search_futures:  # In submission order: original query results come first
+                for doc in future.result():
+                    doc_id = stable_doc_id(doc)
+                    if doc_id not in seen:
+                        seen.add(doc_id)
+                        results.append(doc)
+            return results
+        finally:
+            search_pool.shutdown(cancel_futures=True)
+
+    def _embed_and_search(self, variant: str, k: int) -> List[Document]:
+        return self.vectorstore.similarity_search_by_vector(self.vectorstore.embeddings.embed_query(variant), k)
+
+    @staticmethod
+    def _enqueue(line: str, pending: queue.Queue):
+        variant = _NUMBERING_RE.sub("", line).strip()
+        if variant:
+            pending.put(variant)
+
+
+class LatencyEmbeddings(Embeddings):
+    """Fake embedding API: 100ms per request, whatever the batch size. Counts requests."""
+    def __init__(self, latency: float = 0.1):
+        self.inner = DeterministicFakeEmbedding(size=256)
+        self.latency = latency
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    """FakeListChatModel with a real LLM's timing: `time_to_first_token`, then `sleep` per character.
+    invoke() returns when the whole answer is done, exactly like streaming it to the end."""
+    time_to_first_token: float = 0.0
+
+    def _call(self, *args, **kwargs) -> str:
+        response = super()._call(*args, **kwargs)
+        time.sleep(self.time_to_first_token + (self.sleep or 0) * len(response))
+        return response
+
+    def _stream(self, *args, **kwargs):
+        time.sleep(self.time_to_first_token)
+        yield from super()._stream(*args, **kwargs)
+
+
+class RemoteChroma(Chroma):
+    """Chroma plus a network round-trip per search, like a hosted vector DB."""
+    search_latency = 0.15
+
+    def similarity_search(self, *args, **kwargs):
+        time.sleep(self.search_latency)
+        return super().similarity_search(*args, **kwargs)
+
+    def similarity_search_by_vector(self, *args, **kwargs):
+        time.sleep(self.search_latency)
+        return super().similarity_search_by_vector(*args, **kwargs)
+
+
+def demonstrate_parallel_multi_query():
+    docs = [
+        Document(page_content="The capital of France is Paris. It is known for the Eiffel Tower."),
+        Document(page_content="The capital of Italy is Rome. It is known for the Colosseum."),
+        Document(page_content="The capital of Spain is Madrid."),
+        Document(page_content="Paris is a great city for fashion and art."),
+    ]
+    embeddings = LatencyEmbeddings()
+    # Offline stand-ins. In production: OpenAIEmbeddings() and ChatOpenAI(temperature=0)
+    vector_store = RemoteChroma.from_documents(docs, embeddings, collection_name="parallel_multi_query")
+    variants = "1. What is the largest city in France?\n2. Which French city is famous?\n3. Tell me about Paris."
+    # ~400ms to the first token, then ~40 tokens/s (4 chars per token): about 1s in total.
+    model = SlowFakeChatModel(responses=[variants], time_to_first_token=0.4, sleep=0.006)
+    question = "tell me about the french big city"
+
+    print("--- 1. MultiQueryRetriever (generate, then search one by one) ---")
+    embeddings.calls = 0
+    start = time.perf_counter()
+    results = MultiQueryRetriever.from_llm(retriever=vector_store.as_retriever(), llm=model).invoke(question)
+    print(f"{len(results)} docs in {(time.perf_counter() - start) * 1000:.0f}ms, {embeddings.calls} embedding calls")
+
+    # Waiting for all variants + one embed_documents call (LatencyEmbeddings is symmetric, like OpenAI),
+    # vs. streaming variants into retrieval + one embed_query per variant.
+    for stream_variants, batch_embed_queries in ((False, True), (True, False)):
+        label = "streaming variants" if stream_variants else "batched variants"
+        print(f"\n--- 2. StreamingMultiQueryRetriever ({label}) ---")
+        retriever = StreamingMultiQueryRetriever(
+            vectorstore=vector_store,
+            llm_chain=QUERY_PROMPT | model | StrOutputParser(),
+            stream_variants=stream_variants,
+            batch_embed_queries=batch_embed_queries,
+            max_concurrency=2,  # Vector DB client allows 2 queries in flight
+        )
+        embeddings.calls = 0
+        start = time.perf_counter()
+        results = retriever.invoke(question)
+        print(f"{len(results)} docs in {(time.perf_counter() - start) * 1000:.0f}ms, {embeddings.calls} embedding calls")
+        for d in results:
+            print(f"- {d.page_content}")
+
+    vector_store.delete_collection()
+
+if __name__ == "__main__":
+    demonstrate_parallel_multi_query()
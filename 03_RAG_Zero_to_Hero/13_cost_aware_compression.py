@@ -0,0 +1,186 @@
+import re
+import time
+import zlib
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import numpy as np
+import tiktoken
+from langchain.retrievers.document_compressors import LLMChainExtractor
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from pydantic import ConfigDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Concept: Spend LLM Calls Only Where They Matter ---
+# LLMChainExtractor makes ONE LLM call PER retrieved document, one after another.
+# 10 docs x 800ms = 8 seconds, and you pay for docs that had nothing relevant in them.
+# A cost-aware pipeline:
+# 1. PREFILTER (cheap): embed query + all sentences in ONE batch, drop sentences below a cosine threshold.
+#    Docs with no surviving sentence never reach the LLM.
+# 2. SHORTCUT: if what survived is already short, use it as-is (no LLM call).
+# 3. EXTRACT (expensive): remaining docs go to the LLM, best-first, `max_concurrency` at a time.
+# 4. BUDGET: stop as soon as the final context reaches `token_budget`. Later docs are never sent.
+
+EXTRACT_PROMPT = ChatPromptTemplate.from_template(
+    "Given the following question and context, extract any part of the context *AS IS* that is "
+    "relevant to answer the question. If none of the context is relevant return NO_OUTPUT.\n\n"
+    "Question: {question}\nContext:\n>>>\n{context}\n>>>\nExtracted relevant parts:"
+)
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.?!])\s+")
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode_ordinary(text))
+
+
+class BudgetedCompressor(BaseDocumentCompressor):
+    """Drop-in base_compressor for ContextualCompressionRetriever."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: Embeddings
+    llm: BaseLanguageModel
+    similarity_threshold: float = 0.3
+    min_tokens_for_llm: int = 60  # Prefiltered text shorter than this is used directly
+    max_concurrency: int = 4
+    token_budget: int = 1000
+
+    def _prefilter(self, documents: Sequence[Document], query: str):
+        """Returns [(best_sentence_score, filtered_doc)] for docs that have at least one relevant sentence."""
+        sentences, owners = [], []
+        for i, doc in enumerate(documents):
+            for sentence in _SENTENCE_SPLIT_RE.split(doc.page_content):
+                if sentence.strip():
+                    sentences.append(sentence.strip())
+                    owners.append(i)
+        if not sentences:
+            return []
+
+        # One batched embedding call for every sentence of every document.
+        matrix = np.asarray(self.embeddings.embed_documents(sentences), dtype=np.float32)
+        q = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        q = q / max(np.linalg.norm(q), 1e-12)
+        similarity = matrix @ q
+        keep = similarity >= self.similarity_threshold
+        owners = np.asarray(owners)
+
+        survivors = []
+        for i, doc in enumerate(documents):
+            mask = keep & (owners == i)
+            if mask.any():
+                text = " ".join(s for s, m in zip(sentences, mask) if m)
+                survivors.append((float(similarity[owners == i].max()), Document(page_content=text, metadata=doc.metadata)))
+        survivors.sort(key=lambda pair: -pair[0])  # Best documents get the budget first
+        return survivors
+
+    def compress_documents(self, documents: Sequence[Document], query: str, callbacks: Optional[Callbacks] = None) -> List[Document]:
+        chain = EXTRACT_PROMPT | self.llm | StrOutputParser()
+        candidates = [doc for _, doc in self._prefilter(documents, query)]
+        compressed, used_tokens = [], 0
+
+        for start in range(0, len(candidates), self.max_concurrency):
+            wave = candidates[start:start + self.max_concurrency]
+            needs_llm = [d for d in wave if count_tokens(d.page_content) >= self.min_tokens_for_llm]
+            outputs = iter(chain.batch(
+                [{"question": query, "context": d.page_content} for d in needs_llm],
+                config={"max_concurrency": self.max_concurrency, "callbacks": callbacks},
+            ))
+            for doc in wave:
+                text = next(outputs).strip() if doc in needs_llm else doc.page_content
+                if not text or text == "NO_OUTPUT":
+                    continue
+                n_tokens = count_tokens(text)
+                if used_tokens + n_tokens > self.token_budget:
+                    return compressed  # Budget full: the remaining docs are never sent to the LLM
+                compressed.append(Document(page_content=text, metadata=doc.metadata))
+                used_tokens += n_tokens
+        return compressed
+
+
+class HashingEmbeddings(Embeddings):
+    """Offline stand-in for OpenAIEmbeddings: bag-of-words feature hashing, so word overlap = similarity."""
+    def __init__(self, size: int = 1024):
+        self.size = size
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode()) % self.size] += 1.0
+        return vector.tolist()
+
+
+class CountingSlowChatModel(FakeListChatModel):
+    """Fake LLM: `sleep` seconds per call, counts calls."""
+    calls: int = 0
+
+    def _call(self, *args, **kwargs) -> str:
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+    def batch(self, *args, **kwargs):
+        # FakeListChatModel.batch is a serial loop; real chat models use Runnable.batch (a thread pool).
+        return Runnable.batch(self, *args, **kwargs)
+
+
+def demonstrate_cost_aware_compression():
+    filler = "The report also covers regional logistics, quarterly staffing levels and office renovations. " * 3
+    facts = [
+        "France is known for the Eiffel Tower and its wine.",
+        "French cuisine and fashion make France known worldwide.",
+        "France is known for the Louvre, the most visited museum.",
+        "The Tour de France is what France is known for in sports.",
+        "France is known for cheese, with hundreds of varieties.",
+        "Italy is known for the Colosseum.",
+    ]
+    documents = [Document(page_content=f"{fact} {filler}", metadata={"id": i}) for i, fact in enumerate(facts)]
+    documents += [Document(page_content=filler, metadata={"id": i}) for i in range(len(facts), 12)]
+    query = "What is France known for?"
+    # Offline stand-ins. In production: OpenAIEmbeddings() and ChatOpenAI(temperature=0)
+    embeddings = HashingEmbeddings()
+    answer = "France is known for the Eiffel Tower."
+
+    print("--- 1. LLMChainExtractor (one serial LLM call per doc) ---")
+    llm = CountingSlowChatModel(responses=[answer], sleep=0.2)
+    start = time.perf_counter()
+    result = LLMChainExtractor.from_llm(llm).compress_documents(documents, query)
+    print(f"{len(result)} docs, {llm.calls} LLM calls, {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    print("\n--- 2. BudgetedCompressor, always extract (prefilter + concurrent + 30 token budget) ---")
+    llm = CountingSlowChatModel(responses=[answer], sleep=0.2)
+    compressor = BudgetedCompressor(embeddings=embeddings, llm=llm, min_tokens_for_llm=0,
+                                    max_concurrency=4, token_budget=30)
+    start = time.perf_counter()
+    result = compressor.compress_documents(documents, query)
+    print(f"{len(result)} docs, {llm.calls} LLM calls, {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    print("\n--- 3. BudgetedCompressor, short survivors skip the LLM ---")
+    llm = CountingSlowChatModel(responses=[answer], sleep=0.2)
+    compressor = BudgetedCompressor(embeddings=embeddings, llm=llm, max_concurrency=4, token_budget=60)
+    start = time.perf_counter()
+    result = compressor.compress_documents(documents, query)
+    print(f"{len(result)} docs, {llm.calls} LLM calls, {(time.perf_counter() - start) * 1000:.0f}ms")
+    for d in result:
+        print(f"- [doc {d.metadata['id']}] {d.page_content}")
+
+    # In a retriever:
+    # ContextualCompressionRetriever(base_compressor=compressor, base_retriever=vector_store.as_retriever(search_kwargs={"k": 12}))
+
+if __name__ == "__main__":
+    demonstrate_cost_aware_compression()
@@ -1,6 +1,12 @@
 import os
 import json
-from typing import List
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List
+from urllib.parse import quote
 from dotenv import load_dotenv
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import BaseMessage, messages_to_dict, messages_from_dict, HumanMessage, AIMessage
@@ -63,46 +69,232 @@ print(app.invoke({"question": "What is my name?"}, config={"configurable": {"ses
 # ==========================================
 print("\n--- Challenge 3: File Persistence ---")
 
+# Append-only log, one file per session:
+# - add_messages APPENDS one JSON line per message. No re-reading or rewriting of other sessions.
+# - Loading a session reads only its own file; later loads read only the new tail (byte offset).
+# - clear() appends a marker. Dead lines (before the last clear, torn writes) are removed
+#   by compaction, in a background thread, via rewrite-to-temp + atomic rename.
+# - A lock file per session makes appends and compaction safe across processes (fcntl / msvcrt).
+# - fsync: "always" = survives power loss, "interval" = at most fsync_interval seconds lost (a timer syncs
+#   the last write if no append follows), "never" = OS decides.
+if os.name == "nt":
+    import msvcrt
+
+    @contextmanager
+    def file_lock(path: str, shared: bool = False):
+        # msvcrt has no shared locks: readers take the exclusive lock too.
+        with open(path, "a+b") as f:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    @contextmanager
+    def file_lock(path: str, shared: bool = False):
+        with open(path, "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _truncate_torn_tail(f):
+    """A crash mid-append leaves a line without a newline. Cut it off, or the next append would be glued onto it."""
+    size = pos = f.seek(0, os.SEEK_END)
+    end = 0
+    while pos > 0:
+        step = min(4096, pos)
+        f.seek(pos - step)
+        newline = f.read(step).rfind(b"\n")
+        if newline >= 0:
+            end = pos - step + newline + 1
+            break
+        pos -= step
+    if end != size:
+        f.truncate(end)
+
+_compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-compactor")
+_CLEAR = {"type": "__clear__"}
+_GENERATION = "__generation__"  # First line of a compacted log: {"type": "__generation__", "id": <random hex>}
+
+# fsync="interval" state is per FILE, shared by every FileChatHistory on it in this process.
+_fsync_lock = threading.Lock()
+_last_fsync: Dict[str, float] = {}
+_fsync_timers: Dict[str, threading.Timer] = {}
+
+def _fsync_path(path: str):
+    with _fsync_lock:
+        _fsync_timers.pop(path, None)
+        _last_fsync[path] = time.monotonic()
+    try:
+        with open(path, "ab") as f:
+            os.fsync(f.fileno())
+    except FileNotFoundError:
+        pass
+
+def _fsync_due(path: str, interval: float) -> bool:
+    """True = fsync now. False = synced recently; a timer syncs this write once the interval is over."""
+    now = time.monotonic()
+    with _fsync_lock:
+        elapsed = now - _last_fsync.get(path, float("-inf"))
+        if elapsed >= interval:
+            _last_fsync[path] = now
+            return True
+        if path not in _fsync_timers:
+            timer = _fsync_timers[path] = threading.Timer(interval - elapsed, _fsync_path, (path,))
+            timer.daemon = True
+            timer.start()
+        return False
+
 class FileChatHistory(BaseChatMessageHistory):
-    def __init__(self, session_id: str, file_path: str = "chat_history.json"):
+    def __init__(self, session_id: str, directory: str = "chat_history", fsync: str = "interval",
+                 fsync_interval: float = 1.0, compact_min_dead_lines: int = 1000):
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError(f"fsync must be 'always', 'interval' or 'never', got {fsync!r}")
+        os.makedirs(directory, exist_ok=True)
+        name = quote(session_id, safe="")  # Safe file name for any session id
         self.session_id = session_id
-        self.file_path = file_path
-        self.messages = []
+        self.path = os.path.join(directory, f"{name}.jsonl")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_min_dead_lines = compact_min_dead_lines
+        self._messages: List[BaseMessage] = []
+        self._offset = 0        # Bytes of the log already parsed
+        self._inode = None      # Changes when compaction replaces the file...
+        self._generation = None # ...unless the inode number gets reused, so compaction also writes a new generation id
+        self._dead_lines = 0
+        self._compacting = False
+        self._lock = threading.Lock()
         self.load()
 
+    @property
+    def messages(self) -> List[BaseMessage]:
+        self.load()  # Picks up appends from other workers: reads only the new tail
+        return list(self._messages)
+
     def add_messages(self, messages: List[BaseMessage]):
-        self.messages.extend(messages)
-        self.save()
+        self._append([json.dumps(m) for m in messages_to_dict(messages)])
 
     def clear(self):
-        self.messages = []
-        self.save()
-
-    def save(self):
-        # Load existing data
-        data = {}
-        if os.path.exists(self.file_path):
-            with open(self.file_path, "r") as f:
-                try:
-                    data = json.load(f)
-                except:
-                    pass
-        # Update current session
-        data[self.session_id] = messages_to_dict(self.messages)
-        with open(self.file_path, "w") as f:
-            json.dump(data, f)
+        self._append([json.dumps(_CLEAR)])
+
+    def _append(self, lines: List[str]):
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        with file_lock(self.lock_path):
+            with open(self.path, "a+b") as f:
+                _truncate_torn_tail(f)
+                f.write(data)  # One write per call; O_APPEND puts it at the end
+                f.flush()
+                if self.fsync == "always" or (self.fsync == "interval" and _fsync_due(self.path, self.fsync_interval)):
+                    os.fsync(f.fileno())
+        self.load()
+        self._maybe_compact()
 
     def load(self):
-        if os.path.exists(self.file_path):
-            with open(self.file_path, "r") as f:
-                try:
-                    data = json.load(f)
-                    if self.session_id in data:
-                        self.messages = messages_from_dict(data[self.session_id])
-                except:
-                    pass
+        if not os.path.exists(self.path):
+            return
+        with self._lock, file_lock(self.lock_path, shared=True):
+            with open(self.path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                first = f.readline()
+                header = json.loads(first) if first.endswith(b"\n") else {}
+                generation = header.get("id") if header.get("type") == _GENERATION else None
+                # First load, or compacted (new inode, new generation, or a file shorter than what we parsed): start over
+                if (stat.st_ino, generation) != (self._inode, self._generation) or stat.st_size < self._offset:
+                    self._messages, self._offset, self._dead_lines = [], 0, 0
+                    self._inode, self._generation = stat.st_ino, generation
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Torn write: ignored, cut off by the next append
+                    self._offset += len(line)
+                    record = json.loads(line)
+                    if record.get("type") == _GENERATION:
+                        continue
+                    if record == _CLEAR:
+                        self._dead_lines += len(self._messages) + 1
+                        self._messages = []
+                    else:
+                        self._messages.extend(messages_from_dict([record]))
+
+    def _maybe_compact(self):
+        with self._lock:
+            if self._compacting or self._dead_lines < self.compact_min_dead_lines:
+                return
+            self._compacting = True
+        _compactor.submit(self.compact)
+
+    def compact(self):
+        """Rewrites the log with only the live messages. Readers see the old or the new file, never half."""
+        try:
+            with file_lock(self.lock_path):
+                live, tmp = [], self.path + ".tmp"
+                with open(self.path, "rb") as f:
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        record = json.loads(line)
+                        if record == _CLEAR:
+                            live = []
+                        elif record.get("type") != _GENERATION:
+                            live.append(line)
+                header = json.dumps({"type": _GENERATION, "id": uuid.uuid4().hex}) + "\n"
+                with open(tmp, "wb") as f:
+                    f.write(header.encode("utf-8"))
+                    f.writelines(live)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+        finally:
+            with self._lock:
+                self._compacting = False
+        self.load()
 
 # Test
 history = FileChatHistory("user_persistent")
 history.add_messages([HumanMessage(content="I persist across restarts!")])
 print(f"Loaded from file: {history.messages}")
+
+# Reopen = restart: only this session's file is read.
+print(f"After restart: {FileChatHistory('user_persistent').messages[-1].content}")
+
+# 4 workers appending to the same session at once: nothing lost, no interleaved lines.
+import shutil
+import tempfile
+
+workdir = tempfile.mkdtemp(prefix="chat_history_")
+
+def worker(n: int):
+    h = FileChatHistory("shared", directory=workdir, fsync="never")
+    for i in range(100):
+        h.add_messages([HumanMessage(content=f"worker {n} msg {i}")])
+
+with ThreadPoolExecutor(max_workers=4) as pool:
+    list(pool.map(worker, range(4)))
+print(f"4 workers x 100 appends -> {len(FileChatHistory('shared', directory=workdir).messages)} messages")
+
+# Per-turn cost does not grow with other sessions' history (the old JSON file was rewritten whole every turn).
+for n in range(500):
+    FileChatHistory(f"other_{n}", directory=workdir, fsync="never").add_messages(
+        [HumanMessage(content="hi " * 50), AIMessage(content="hello " * 50)] * 10)
+history = FileChatHistory("timed", directory=workdir, fsync="never")
+start = time.perf_counter()
+for i in range(100):
+    history.add_messages([HumanMessage(content=f"turn {i}"), AIMessage(content="ok")])
+print(f"add_messages with 500 other sessions on disk: {(time.perf_counter() - start) * 10:.2f}ms/turn")
+
+# clear() leaves dead lines; compaction rewrites the log in the background.
+history = FileChatHistory("compacted", directory=workdir, fsync="never", compact_min_dead_lines=100)
+history.add_messages([HumanMessage(content=f"old {i}") for i in range(150)])
+history.clear()
+history.add_messages([HumanMessage(content="fresh start")])
+_compactor.submit(lambda: None).result()  # Wait for the background compaction (demo only)
+with open(history.path) as f:
+    print(f"After clear + compaction: {sum(1 for _ in f)} line(s) on disk, messages={[m.content for m in history.messages]}")
+shutil.rmtree(workdir, ignore_errors=True)
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 from fastapi import FastAPI
 from langserve import add_routes
-from packages.agent import pirate_agent
+from packages.agent import cached_pirate_agent, pirate_agent
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,6 +24,13 @@ add_routes(
     path="/pirate",
 )
 
+# 2. Same agent with a semantic cache in front (same endpoints under /pirate-cached)
+add_routes(
+    app,
+    cached_pirate_agent,
+    path="/pirate-cached",
+)
+
 if __name__ == "__main__":
     import uvicorn
     # Start the server
@@ -1,6 +1,7 @@
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from packages.semantic_cache import SemanticCache, SemanticCacheRunnable
 
 # This file represents a reusable "Package" or "Library"
 # In a real repo, this might be pip-installable.
@@ -14,5 +15,14 @@ prompt = ChatPromptTemplate.from_template(
 # A simple chain
 pirate_agent = prompt | model | StrOutputParser()
 
+# The same chain behind a semantic cache: near-identical questions (FAQ traffic)
+# are answered from memory instead of calling the model again.
+cached_pirate_agent = SemanticCacheRunnable(
+    pirate_agent,
+    embeddings=OpenAIEmbeddings(model="text-embedding-3-small"),
+    cache=SemanticCache(max_entries=10_000, ttl_seconds=3600, threshold=0.95),
+    key=lambda x: x["text"],
+)
+
 # A more complex chain could go here
 # ...
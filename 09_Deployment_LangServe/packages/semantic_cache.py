@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import patch_config
+
+logger = logging.getLogger(__name__)
+
+# Semantic cache: "What's yer name?" and "what is your name" should not both cost an LLM call.
+# 1. Embed the input (one cheap embedding call instead of one expensive LLM call).
+# 2. Cosine-search past inputs (one NumPy matrix-vector product).
+# 3. Above `threshold` -> return the stored answer (invoke AND stream).
+# Entries expire after their TTL; when full, the least recently used entry is evicted.
+# Hits and misses both run inside the wrapper's own run, so tracing and astream_events see cached answers too.
+# If the embedding call fails, the request goes straight to the chain: the cache is an optimization, not a dependency.
+
+
+def default_cache_key(input: Any) -> str:
+    """Text that gets embedded. Dict inputs (prompt variables) are joined in key order."""
+    if isinstance(input, dict):
+        return "\n".join(f"{k}: {input[k]}" for k in sorted(input))
+    return str(input)
+
+
+class SemanticCache:
+    """Thread-safe in-memory vector index of (input embedding -> answer)."""
+
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: float = 3600.0, threshold: float = 0.95):
+        if max_entries <= 0:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None      # (capacity x dim), L2-normalized rows
+        self._expires_at = np.zeros(0, dtype=np.float64)  # 0 = free slot
+        self._last_used = np.zeros(0, dtype=np.int64)    # Logical clock for LRU
+        self._answers: list = []
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _grow(self, dim: int):
+        old = 0 if self._vectors is None else len(self._vectors)
+        new = min(max(16, old * 2), self.max_entries)
+        vectors = np.zeros((new, dim), dtype=np.float32)
+        if old:
+            vectors[:old] = self._vectors
+        self._vectors = vectors
+        self._expires_at = np.concatenate([self._expires_at, np.zeros(new - old)])
+        self._last_used = np.concatenate([self._last_used, np.zeros(new - old, dtype=np.int64)])
+        self._answers.extend([None] * (new - old))
+
+    def lookup(self, vector) -> Optional[Any]:
+        q = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self.misses += 1
+                return None
+            scores = self._vectors @ q
+            scores[self._expires_at <= time.monotonic()] = -np.inf  # Expired and free slots never match
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._clock += 1
+            self._last_used[best] = self._clock
+            self.hits += 1
+            return self._answers[best]
+
+    def put(self, vector, answer: Any, ttl_seconds: Optional[float] = None):
+        q = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None:
+                self._grow(len(q))
+            free = np.flatnonzero(self._expires_at <= now)  # Never-used or expired slots
+            if len(free) == 0 and len(self._vectors) < self.max_entries:
+                self._grow(len(q))
+                free = np.flatnonzero(self._expires_at <= now)
+            slot = int(free[0]) if len(free) else int(np.argmin(self._last_used))  # Full: evict LRU
+            self._clock += 1
+            self._vectors[slot] = q
+            self._answers[slot] = answer
+            self._expires_at[slot] = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+            self._last_used[slot] = self._clock
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(np.count_nonzero(self._expires_at > time.monotonic()))
+
+
+class SemanticCacheRunnable(Runnable):
+    """Wraps any chain. Same input/output schema, so it works with `add_routes` and the playground."""
+
+    def __init__(self, runnable: Runnable, embeddings: Embeddings, cache: Optional[SemanticCache] = None,
+                 key: Callable[[Any], str] = default_cache_key):
+        self.runnable = runnable
+        self.embeddings = embeddings
+        self.cache = cache or SemanticCache()
+        self.key = key
+
+    @property
+    def InputType(self):
+        return self.runnable.InputType
+
+    @property
+    def OutputType(self):
+        return self.runnable.OutputType
+
+    def get_input_schema(self, config: Optional[RunnableConfig] = None):
+        return self.runnable.get_input_schema(config)
+
+    def get_output_schema(self, config: Optional[RunnableConfig] = None):
+        return self.runnable.get_output_schema(config)
+
+    def _embed(self, input: Any) -> Optional[List[float]]:
+        try:
+            return self.embeddings.embed_query(self.key(input))
+        except Exception as e:
+            logger.warning("semantic cache bypassed, embedding failed: %r", e)
+            return None
+
+    async def _aembed(self, input: Any) -> Optional[List[float]]:
+        try:
+            return await self.embeddings.aembed_query(self.key(input))
+        except Exception as e:
+            logger.warning("semantic cache bypassed, embedding failed: %r", e)
+            return None
+
+    def _lookup(self, vector: Optional[List[float]]) -> Optional[Any]:
+        return None if vector is None else self.cache.lookup(vector)
+
+    def _put(self, vector: Optional[List[float]], output: Any):
+        if vector is not None and output is not None:  # Only cache answers that completed
+            self.cache.put(vector, output)
+
+    def _invoke(self, input: Any, run_manager: CallbackManagerForChainRun, config: RunnableConfig, **kwargs: Any) -> Any:
+        vector = self._embed(input)
+        cached = self._lookup(vector)
+        if cached is not None:
+            return cached
+        output = self.runnable.invoke(input, patch_config(config, callbacks=run_manager.get_child()), **kwargs)
+        self._put(vector, output)
+        return output
+
+    async def _ainvoke(self, input: Any, run_manager: AsyncCallbackManagerForChainRun, config: RunnableConfig,
+                       **kwargs: Any) -> Any:
+        vector = await self._aembed(input)
+        cached = self._lookup(vector)
+        if cached is not None:
+            return cached
+        output = await self.runnable.ainvoke(input, patch_config(config, callbacks=run_manager.get_child()), **kwargs)
+        self._put(vector, output)
+        return output
+
+    def _transform(self, inputs: Iterator[Any], run_manager: CallbackManagerForChainRun, config: RunnableConfig,
+                   **kwargs: Any) -> Iterator[Any]:
+        input = next(inputs)  # stream()/astream() pass exactly one input
+        vector = self._embed(input)
+        cached = self._lookup(vector)
+        if cached is not None:
+            yield cached  # Whole answer in one chunk
+            return
+        final = None
+        for chunk in self.runnable.stream(input, patch_config(config, callbacks=run_manager.get_child()), **kwargs):
+            final = chunk if final is None else final + chunk
+            yield chunk
+        self._put(vector, final)
+
+    async def _atransform(self, inputs: AsyncIterator[Any], run_manager: AsyncCallbackManagerForChainRun,
+                          config: RunnableConfig, **kwargs: Any) -> AsyncIterator[Any]:
+        input = await inputs.__anext__()
+        vector = await self._aembed(input)
+        cached = self._lookup(vector)
+        if cached is not None:
+            yield cached
+            return
+        final = None
+        child_config = patch_config(config, callbacks=run_manager.get_child())
+        async for chunk in self.runnable.astream(input, child_config, **kwargs):
+            final = chunk if final is None else final + chunk
+            yield chunk
+        self._put(vector, final)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self._call_with_config(self._invoke, input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await self._acall_with_config(self._ainvoke, input, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        yield from self._transform_stream_with_config(iter([input]), self._transform, config, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        async def single():
+            yield input
+        async for chunk in self._atransform_stream_with_config(single(), self._atransform, config, **kwargs):
+            yield chunk
+
+
+if __name__ == "__main__":
+    # Offline demo: python -m packages.semantic_cache
+    import re
+    import zlib
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+    class HashingEmbeddings(Embeddings):
+        """Stand-in for OpenAIEmbeddings: bag-of-words feature hashing."""
+        def embed_documents(self, texts):
+            return [self.embed_query(t) for t in texts]
+
+        def embed_query(self, text):
+            vector = np.zeros(512, dtype=np.float32)
+            for word in re.findall(r"\w+", text.lower()):
+                vector[zlib.crc32(word.encode()) % 512] += 1.0
+            return vector.tolist()
+
+    prompt = ChatPromptTemplate.from_template("Answer briefly in pirate speak.\n\nUser: {text}")
+    model = FakeListChatModel(responses=["Arr, they call me Cap'n Byte!"], sleep=0.02)  # Per streamed character
+    chain = SemanticCacheRunnable(prompt | model | StrOutputParser(), HashingEmbeddings(),
+                                  SemanticCache(threshold=0.9), key=lambda x: x["text"])
+
+    for question in ["What is your name?", "what is your name", "What is your name?!"]:
+        start = time.perf_counter()
+        chunks = list(chain.stream({"text": question}))
+        print(f"{question!r:<24} {len(chunks):>2} chunk(s) in {(time.perf_counter() - start) * 1000:4.0f}ms: {''.join(chunks)}")
+    print(f"hits={chain.cache.hits} misses={chain.cache.misses}")
@@ -1,9 +1,15 @@
+import hashlib
 import os
-from typing import TypedDict, List
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, TypedDict
+
+import numpy as np
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.pydantic_v1 import BaseModel, Field
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 
 load_dotenv()
@@ -20,19 +26,75 @@ print("--- Lesson 1: Agentic RAG (Self-Correcting) ---")
 
 class GraphState(TypedDict):
     question: str
+    original_question: str  # Set once by the first retrieve; rewrites only change `question`
     generation: str
     documents: List[str]
     re_ask_count: int
+    candidates: Dict[int, float]  # Carried across rewrites: corpus row -> best score over all queries so far
+
+# Local Index
+# A rewrite loop used to start retrieval from nothing. Instead, the retrieve node carries the candidate set forward:
+# 1. Re-score the carried candidates against the new query (their vectors are already in RAM, k dot products).
+# 2. ONE search for the new query that skips rows already in the candidate set.
+# 3. Merge: each candidate keeps its best score over every query so far; return the top-k.
+#    Candidates already graded irrelevant stay in the set (so they are never searched again)
+#    but are never returned again: the point of a rewrite is to find DIFFERENT documents.
+# Same top-k as re-running every query from scratch, for the cost of one search per rewrite.
+RETRIEVE_K = 4
+
+class LocalIndex:
+    def __init__(self, texts: List[str], vectors: np.ndarray):
+        self.texts = texts
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def search(self, query_vector: np.ndarray, k: int, exclude: Optional[np.ndarray] = None):
+        scores = self.vectors @ query_vector
+        if exclude is not None and len(exclude):
+            scores[exclude] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.isfinite(scores[top])]
+        return top, scores[top]
+
+def incremental_search(index: LocalIndex, query_vector, candidates: Dict[int, float], k: int = RETRIEVE_K,
+                       rejected: Iterable[int] = ()):
+    """Returns (top-k rows, updated candidates). `candidates` is not modified. `rejected` rows are never returned."""
+    q = np.asarray(query_vector, dtype=np.float32)
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+    merged = dict(candidates)
+    seen = np.fromiter(merged.keys(), dtype=np.int64, count=len(merged))
+    if len(seen):
+        for row, score in zip(seen.tolist(), (index.vectors[seen] @ q).tolist()):
+            merged[row] = max(merged[row], score)
+    rows, scores = index.search(q, k, exclude=seen)
+    for row, score in zip(rows.tolist(), scores.tolist()):
+        merged[row] = score
+    rejected = set(rejected)
+    top = sorted((row for row in merged if row not in rejected), key=merged.get, reverse=True)[:k]
+    return top, merged
+
+embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+corpus = [
+    "Apple pie recipe: mix flour, butter and apples.",
+    "How to fix a car that will not start.",
+    "LangChain is a framework for building LLM applications.",
+    "LangGraph enables cycles and state in agent workflows.",
+    "LangSmith traces and evaluates LLM runs.",
+    "Chroma is a local vector database.",
+]
+index = LocalIndex(corpus, embeddings.embed_documents(corpus))
 
-# Mock Retriever
 def retrieve(state: GraphState):
     print("--- [Node] Retrieve ---")
     query = state["question"]
-    # Simulate bad retrieval for the first try
-    if state.get("re_ask_count", 0) == 0:
-        return {"documents": ["Apple pie recipe", "How to fix a car"]} # Irrelevant to most queries
-    else:
-        return {"documents": ["LangChain is a framework...", "LangGraph enables cycles..."]}
+    updates = {} if state.get("original_question") else {"original_question": query}
+    candidates = state.get("candidates") or {}
+    original = state.get("original_question") or query
+    rejected = [row for row in candidates if _cached_grade(original, index.texts[row]) == "no"]
+    query_vector = embeddings.embed_query(query)  # The only embedding call per rewrite
+    top, candidates = incremental_search(index, query_vector, candidates, rejected=rejected)
+    return {**updates, "documents": [index.texts[i] for i in top], "candidates": candidates}
 
 # Grader
 class GradeDocuments(BaseModel):
@@ -50,23 +112,81 @@ grader_prompt = ChatPromptTemplate.from_template(
 )
 grader_chain = grader_prompt | structured_llm_grader
 
-def grade_documents(state: GraphState):
-    print("--- [Node] Grade Documents ---")
-    question = state["question"]
-    documents = state["documents"]
-    
+# Grading is the hot loop: k docs x every retry. Three fixes:
+# 1. BATCH: grade all docs concurrently (grader_chain.batch / abatch), capped at GRADE_MAX_CONCURRENCY.
+# 2. EARLY STOP: with GRADE_ENOUGH_RELEVANT = n, stop sending docs once n relevant ones are found.
+# 3. MEMOIZE: (ORIGINAL question, doc hash) -> grade. Keyed on the user's question, not the rewrite,
+#    so it survives across loop iterations and a doc is never graded twice. LRU-bounded.
+GRADE_MAX_CONCURRENCY = 4
+GRADE_ENOUGH_RELEVANT: Optional[int] = None  # e.g. 3. None = grade everything
+GRADE_CACHE_SIZE = 10_000
+_grade_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+def _grade_key(question: str, document: str) -> Tuple[str, str]:
+    return question, hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+def _cached_grade(question: str, document: str) -> Optional[str]:
+    key = _grade_key(question, document)
+    if key in _grade_cache:
+        _grade_cache.move_to_end(key)
+    return _grade_cache.get(key)
+
+def _pending_waves(question: str, documents: List[str]):
+    """Yields waves of not-yet-graded doc indexes; stops early once enough relevant docs are known."""
+    grades = [_cached_grade(question, d) for d in documents]
+    pending = [i for i, g in enumerate(grades) if g is None]
+    wave_size = GRADE_MAX_CONCURRENCY if GRADE_ENOUGH_RELEVANT else max(len(pending), 1)
+    for start in range(0, len(pending), wave_size):
+        relevant = sum(_cached_grade(question, d) == "yes" for d in documents)
+        if GRADE_ENOUGH_RELEVANT and relevant >= GRADE_ENOUGH_RELEVANT:
+            return
+        yield pending[start:start + wave_size]
+
+def _store_grades(question: str, documents: List[str], wave: List[int], scores):
+    for i, score in zip(wave, scores):
+        _grade_cache[_grade_key(question, documents[i])] = score.binary_score
+        _grade_cache.move_to_end(_grade_key(question, documents[i]))
+    while len(_grade_cache) > GRADE_CACHE_SIZE:
+        _grade_cache.popitem(last=False)  # Least recently used
+
+def _filter_graded(question: str, documents: List[str]):
     filtered_docs = []
-    relevant = False
     for d in documents:
-        score = grader_chain.invoke({"question": question, "document": d})
-        if score.binary_score == "yes":
+        grade = _cached_grade(question, d)
+        if grade == "yes":
             print(f"  - Doc '{d[:15]}...' is RELEVANT")
             filtered_docs.append(d)
-            relevant = True
+        elif grade is None:
+            print(f"  - Doc '{d[:15]}...' SKIPPED (enough relevant docs)")
         else:
             print(f"  - Doc '{d[:15]}...' is IRRELEVANT")
-            
-    return {"documents": filtered_docs, "run_web_search": not relevant}
+    return {"documents": filtered_docs, "run_web_search": not filtered_docs}
+
+def grade_documents(state: GraphState):
+    print("--- [Node] Grade Documents ---")
+    question = state.get("original_question") or state["question"]
+    documents = state["documents"]
+
+    for wave in _pending_waves(question, documents):
+        scores = grader_chain.batch(
+            [{"question": question, "document": documents[i]} for i in wave],
+            config={"max_concurrency": GRADE_MAX_CONCURRENCY},
+        )
+        _store_grades(question, documents, wave, scores)
+    return _filter_graded(question, documents)
+
+async def agrade_documents(state: GraphState):
+    print("--- [Node] Grade Documents (async) ---")
+    question = state.get("original_question") or state["question"]
+    documents = state["documents"]
+
+    for wave in _pending_waves(question, documents):
+        scores = await grader_chain.abatch(
+            [{"question": question, "document": documents[i]} for i in wave],
+            config={"max_concurrency": GRADE_MAX_CONCURRENCY},
+        )
+        _store_grades(question, documents, wave, scores)
+    return _filter_graded(question, documents)
 
 def transform_query(state: GraphState):
     print("--- [Node] Transform Query (Re-writing) ---")
@@ -88,7 +208,7 @@ def decide_to_generate(state: GraphState):
 workflow = StateGraph(GraphState)
 
 workflow.add_node("retrieve", retrieve)
-workflow.add_node("grade_documents", grade_documents)
+workflow.add_node("grade_documents", RunnableLambda(grade_documents, afunc=agrade_documents))  # invoke -> sync, ainvoke -> async
 workflow.add_node("transform_query", transform_query)
 workflow.add_node("generate", generate)
 
@@ -111,3 +231,37 @@ app = workflow.compile()
 # Run
 final = app.invoke({"question": "What is LangGraph?", "re_ask_count": 0})
 print(f"\nFinal Generation: {final.get('generation')}")
+
+# Same question again: every grade comes from the cache, zero grader calls.
+final = app.invoke({"question": "What is LangGraph?", "re_ask_count": 0})
+print(f"\nFinal Generation (cached grades): {final.get('generation')}")
+
+# ==========================================
+# Benchmark: 5 rewrites on a synthetic 200k x 384 corpus.
+# "From scratch" re-runs every query so far on each iteration (to get the same merged candidates),
+# incremental runs exactly one search per iteration.
+# ==========================================
+print("\n--- Benchmark: From-scratch vs Incremental Retrieval ---")
+rng = np.random.default_rng(0)
+bench_index = LocalIndex([""] * 200_000, rng.standard_normal((200_000, 384), dtype=np.float32))
+base_query = rng.standard_normal(384, dtype=np.float32)
+rewrites = [base_query + 0.5 * rng.standard_normal(384, dtype=np.float32) for _ in range(5)]
+
+start = time.perf_counter()
+for t in range(1, len(rewrites) + 1):
+    queries = np.stack(rewrites[:t])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    best = (bench_index.vectors @ queries.T).max(axis=1)  # Best score over every query so far
+    top = np.argpartition(best, -RETRIEVE_K)[-RETRIEVE_K:]
+    scratch_top = top[np.argsort(-best[top])].tolist()
+scratch_time = time.perf_counter() - start
+
+start = time.perf_counter()
+carried: Dict[int, float] = {}
+for q in rewrites:
+    incremental_top, carried = incremental_search(bench_index, q, carried)
+incremental_time = time.perf_counter() - start
+
+print(f"From scratch: {scratch_time * 1000:.0f}ms ({sum(range(1, len(rewrites) + 1))} corpus scans)")
+print(f"Incremental:  {incremental_time * 1000:.0f}ms ({len(rewrites)} corpus scans)")
+print(f"Same final top-{RETRIEVE_K}: {scratch_top == incremental_top}")
@@ -1,10 +1,28 @@
 import os
+import asyncio
+import json
+import logging
+import time
+import hashlib
+import heapq
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+import tiktoken
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 # ==========================================
 # CONCEPT: Vector Store Router
@@ -15,13 +33,293 @@ load_dotenv()
 
 print("--- Lesson 4: Vector Store Router ---")
 
+@lru_cache(maxsize=1)
+def _tokenizer():
+    # Same tokenizer family as text-embedding-3-*. Loaded once, reused for every doc.
+    return tiktoken.get_encoding("cl100k_base")
+
+def token_batches(docs: List[Document], max_batch_tokens: int = 8000, max_batch_size: int = 512):
+    """Group docs so each embedding request stays under a TOKEN budget (not just an item count).
+    Short docs get packed into big batches, long docs get small batches."""
+    batch, batch_tokens = [], 0
+    for doc in docs:
+        n_tokens = len(_tokenizer().encode(doc.page_content, disallowed_special=()))
+        if batch and (batch_tokens + n_tokens > max_batch_tokens or len(batch) >= max_batch_size):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(doc)
+        batch_tokens += n_tokens
+    if batch:
+        yield batch
+
+def content_id(doc: Document) -> str:
+    # Content-hash ids make re-ingesting the same doc an overwrite, not a duplicate.
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+# ==========================================
+# Per-Tenant Shards
+# One shared "free_tier" collection for thousands of tenants = every search scans everyone,
+# and one tenant's delete/re-index touches everybody. Instead: ONE SHARD PER TENANT.
+# Only ACTIVE tenants are in RAM:
+# - LAZY OPEN: a shard is loaded from disk on first use
+# - LRU POOL: open shards are kept in an LRU with a memory budget; over budget -> evict least recently used
+# - IDLE EVICTION: shards untouched for `max_idle_seconds` are flushed and closed, by a background sweeper
+#   (which also flushes dirty shards), so a quiet pool still reaches disk
+# - PINNING: a shard in use (search/write in progress) is never evicted
+# - NO GLOBAL STALLS: disk loads and flushes run OUTSIDE the pool lock; only the tenant involved waits
+# ==========================================
+class TenantShard:
+    """Vectors (float32, L2-normalized) + docs for one tenant.
+    Persisted as gen-N/vectors.npy + gen-N/docs.jsonl; the file CURRENT names the live generation."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.docs: List[Document] = []
+        self.row_of: Dict[str, int] = {}  # doc id -> row, so re-ingesting a doc overwrites it
+        self.text_bytes = 0
+        self.dirty = False
+        self.generation = 0
+        self.lock = threading.Lock()
+        current = os.path.join(directory, "CURRENT")
+        if os.path.exists(current):
+            with open(current, encoding="utf-8") as f:
+                self.generation = int(f.read().strip())
+            generation_dir = self._generation_dir(self.generation)
+            self.vectors = np.load(os.path.join(generation_dir, "vectors.npy"))
+            with open(os.path.join(generation_dir, "docs.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    self.row_of[row["id"]] = len(self.docs)
+                    self.docs.append(Document(page_content=row["text"], metadata=row["metadata"], id=row["id"]))
+                    self.text_bytes += len(row["text"])
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.directory, f"gen-{generation:06d}")
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self.text_bytes
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], docs: List[Document]):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        with self.lock:
+            new_rows = []
+            for doc_id, vector, doc in zip(ids, vectors, docs):
+                stored = Document(page_content=doc.page_content, metadata=doc.metadata, id=doc_id)
+                if doc_id in self.row_of:
+                    row = self.row_of[doc_id]
+                    self.text_bytes += len(stored.page_content) - len(self.docs[row].page_content)
+                    self.vectors[row] = vector
+                    self.docs[row] = stored
+                else:
+                    self.row_of[doc_id] = len(self.docs)
+                    self.docs.append(stored)
+                    self.text_bytes += len(stored.page_content)
+                    new_rows.append(vector)
+            if new_rows:
+                new_rows = np.stack(new_rows)
+                self.vectors = np.concatenate([self.vectors, new_rows]) if len(self.vectors) else new_rows
+            self.dirty = True
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Tuple[float, Document]]:
+        with self.lock:
+            if not len(self.docs):
+                return []
+            scores = self.vectors @ query_vector
+            k = min(k, len(scores))
+            top = np.argpartition(scores, -k)[-k:]
+            return [(float(scores[i]), self.docs[i]) for i in top[np.argsort(-scores[top])]]
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            # Both files go into a NEW generation directory; then ONE atomic rename of CURRENT switches to it.
+            # A crash at any point leaves CURRENT on a complete, matching vectors/docs pair.
+            generation = self.generation + 1
+            generation_dir = self._generation_dir(generation)
+            shutil.rmtree(generation_dir, ignore_errors=True)  # Leftover of a crashed flush
+            os.makedirs(generation_dir)
+            np.save(os.path.join(generation_dir, "vectors.npy"), self.vectors)
+            with open(os.path.join(generation_dir, "docs.jsonl"), "w", encoding="utf-8") as f:
+                for d in self.docs:
+                    f.write(json.dumps({"id": d.id, "text": d.page_content, "metadata": d.metadata}) + "\n")
+            tmp_current = os.path.join(self.directory, "CURRENT.tmp")
+            with open(tmp_current, "w", encoding="utf-8") as f:
+                f.write(str(generation))
+            os.replace(tmp_current, os.path.join(self.directory, "CURRENT"))
+            shutil.rmtree(self._generation_dir(self.generation), ignore_errors=True)
+            self.generation = generation
+            self.dirty = False
+
+
+class ShardPool:
+    def __init__(self, root: str, memory_budget_bytes: int = 256 * 1024 * 1024, max_idle_seconds: float = 300.0,
+                 sweep_interval: Optional[float] = None):
+        self.root = root
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_idle_seconds = max_idle_seconds
+        self._open: "OrderedDict[str, TenantShard]" = OrderedDict()  # LRU order: oldest first
+        self._last_used: Dict[str, float] = {}
+        self._pins: Dict[str, int] = {}  # Only tenants in use right now
+        self._sizes: Dict[str, int] = {}  # nbytes of each open shard when last released
+        self._memory_bytes = 0            # Running total of _sizes: no re-summing on every release
+        self._loading: Dict[str, threading.Event] = {}  # Tenant being read from disk
+        self._closing: Dict[str, threading.Event] = {}  # Tenant being flushed to disk
+        self._lock = threading.RLock()  # Guards the dicts above only: never held during disk I/O
+        self.open_latencies: List[float] = []
+        self.close_latencies: List[float] = []
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep_loop, daemon=True, name="shard-sweeper",
+                                         args=(sweep_interval or min(max_idle_seconds / 2, 30.0),))
+        self._sweeper.start()
+
+    def _directory(self, tenant_id: str) -> str:
+        # Hashed name: tenant ids can contain characters that are not valid in paths.
+        return os.path.join(self.root, hashlib.sha1(tenant_id.encode("utf-8")).hexdigest())
+
+    def _pin(self, tenant_id: str):
+        self._open.move_to_end(tenant_id)
+        self._last_used[tenant_id] = time.monotonic()
+        self._pins[tenant_id] = self._pins.get(tenant_id, 0) + 1
+
+    def _acquire(self, tenant_id: str) -> TenantShard:
+        while True:
+            with self._lock:
+                shard = self._open.get(tenant_id)
+                if shard is not None:
+                    self._pin(tenant_id)
+                    return shard
+                busy = self._loading.get(tenant_id) or self._closing.get(tenant_id)
+                if busy is None:
+                    loaded = self._loading[tenant_id] = threading.Event()
+            if busy is not None:
+                busy.wait()  # Someone else is loading or flushing THIS tenant; other tenants are unaffected
+                continue
+            try:
+                start = time.perf_counter()
+                shard = TenantShard(self._directory(tenant_id))  # Disk read, outside the pool lock
+                with self._lock:
+                    self.open_latencies.append(time.perf_counter() - start)
+                    self._open[tenant_id] = shard
+                    self._sizes[tenant_id] = shard.nbytes
+                    self._memory_bytes += shard.nbytes
+                    self._pin(tenant_id)
+                return shard
+            finally:
+                with self._lock:
+                    del self._loading[tenant_id]
+                loaded.set()
+
+    @contextmanager
+    def open(self, tenant_id: str) -> Iterator[TenantShard]:
+        """Pins the tenant's shard for the duration of the with-block (opening it lazily)."""
+        shard = self._acquire(tenant_id)
+        try:
+            yield shard
+        finally:
+            with self._lock:
+                self._pins[tenant_id] -= 1
+                if not self._pins[tenant_id]:
+                    del self._pins[tenant_id]
+                self._last_used[tenant_id] = time.monotonic()
+                size = shard.nbytes  # Writes inside the with-block may have grown it
+                self._memory_bytes += size - self._sizes[tenant_id]
+                self._sizes[tenant_id] = size
+                victims = self._pick_victims()
+            self._close(victims)
+
+    def _detach(self, tenant_id: str) -> Tuple[str, TenantShard]:
+        # Under the pool lock: remove from the pool; later opens wait on _closing until the flush is done.
+        self._closing[tenant_id] = threading.Event()
+        del self._last_used[tenant_id]
+        self._memory_bytes -= self._sizes.pop(tenant_id)
+        return tenant_id, self._open.pop(tenant_id)
+
+    def _close(self, victims: List[Tuple[str, TenantShard]]):
+        """Flushes detached shards. Runs WITHOUT the pool lock."""
+        for tenant_id, shard in victims:
+            start = time.perf_counter()
+            try:
+                shard.flush()
+            finally:
+                with self._lock:
+                    self.close_latencies.append(time.perf_counter() - start)
+                    self._closing.pop(tenant_id).set()
+
+    def _pick_victims(self) -> List[Tuple[str, TenantShard]]:
+        now, victims = time.monotonic(), []
+        for tenant_id in list(self._open):  # Oldest first
+            if not self._pins.get(tenant_id) and now - self._last_used[tenant_id] > self.max_idle_seconds:
+                victims.append(self._detach(tenant_id))
+        for tenant_id in list(self._open):
+            if self.memory_bytes <= self.memory_budget_bytes:
+                break
+            if not self._pins.get(tenant_id):
+                victims.append(self._detach(tenant_id))
+        return victims
+
+    def sweep(self):
+        """Closes idle shards and flushes dirty ones, even when no request comes in to trigger it."""
+        with self._lock:
+            victims = self._pick_victims()
+            still_open = list(self._open.values())
+        self._close(victims)
+        for shard in still_open:
+            shard.flush()
+
+    def _sweep_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            self.sweep()
+
+    def flush_all(self):
+        with self._lock:
+            shards = list(self._open.values())
+        for shard in shards:
+            shard.flush()
+
+    def close_all(self):
+        self._stop.set()
+        with self._lock:
+            victims = [self._detach(t) for t in list(self._open) if not self._pins.get(t)]
+            in_use = [(t, self._open[t]) for t in self._pins]
+        self._close(victims)
+        for tenant_id, shard in in_use:  # Can't be closed under a caller's feet, but its writes still reach disk
+            logger.warning("shard %s still in use at close_all(): flushed, left open", tenant_id)
+            shard.flush()
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    def stats(self) -> dict:
+        ms = lambda xs, q: round(float(np.percentile(xs, q)) * 1000, 2) if xs else 0.0
+        return {"open_shards": len(self._open), "memory_mb": round(self.memory_bytes / 1e6, 2),
+                "opens": len(self.open_latencies), "closes": len(self.close_latencies),
+                "open_ms_p50": ms(self.open_latencies, 50), "open_ms_p95": ms(self.open_latencies, 95),
+                "close_ms_p50": ms(self.close_latencies, 50), "close_ms_p95": ms(self.close_latencies, 95)}
+
+
+# Shard searches are I/O bound in production (remote shards), so a wide thread pool is fine.
+_SCATTER_POOL = ThreadPoolExecutor(max_workers=128, thread_name_prefix="scatter")
+
 class VectorStoreRouter:
-    def __init__(self):
-        self.embeddings = OpenAIEmbeddings()
+    def __init__(self, embeddings: Embeddings = None, collection_name: str = "free_tier",
+                 shard_root: Optional[str] = None, shard_memory_budget_bytes: int = 256 * 1024 * 1024,
+                 shard_max_idle_seconds: float = 300.0, max_stragglers_per_shard: int = 2):
+        self.embeddings = embeddings or OpenAIEmbeddings()
         # Tier 1: Local
-        self.local_db = Chroma(collection_name="free_tier", embedding_function=self.embeddings)
+        self.local_db = Chroma(collection_name=collection_name, embedding_function=self.embeddings)
         # Tier 2: Cloud (MockedDict for demo, replace with Pinecone in prod)
         self.cloud_db_mock = {}
+        # Per-tenant shards (opened lazily). No shard_root = a private temp dir, never shared with another router.
+        self.shards = ShardPool(shard_root or tempfile.mkdtemp(prefix="tenant_shards_"),
+                                shard_memory_budget_bytes, shard_max_idle_seconds)
+        # Shard name -> its timed-out searches, until they finish (pruned on every search_many)
+        self.max_stragglers_per_shard = max_stragglers_per_shard
+        self._stragglers: Dict[str, List[Future]] = {}
+        self._stragglers_lock = threading.Lock()
 
     def ingest(self, doc: Document, user_tier: str):
         print(f"Ingesting doc for {user_tier} user...")
@@ -35,13 +333,281 @@ class VectorStoreRouter:
         else:
             raise ValueError("Unknown Tier")
 
-    def search(self, query: str, user_tier: str):
+    def ingest_bulk(
+        self,
+        docs: List[Document],
+        user_tier: str,
+        max_batch_tokens: int = 8000,
+        max_concurrency: int = 4,
+        write_batch_size: int = 5000,
+    ) -> dict:
+        """Bulk path: token-sized embedding batches, N batches in flight, big write transactions."""
+        if user_tier not in ("free", "pro"):
+            raise ValueError("Unknown Tier")
+        print(f"Bulk ingesting {len(docs)} docs for {user_tier} user...")
+        start = time.perf_counter()
+        batches = list(token_batches(docs, max_batch_tokens=max_batch_tokens))
+
+        def embed(batch):
+            return self.embeddings.embed_documents([d.page_content for d in batch])
+
+        pending_docs, pending_vectors = [], []
+        # pool.map keeps at most `max_concurrency` embedding calls running and yields in order.
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            for batch, vectors in zip(batches, pool.map(embed, batches)):
+                pending_docs.extend(batch)
+                pending_vectors.extend(vectors)
+                if len(pending_docs) >= write_batch_size:
+                    self._write(pending_docs, pending_vectors, user_tier)
+                    pending_docs, pending_vectors = [], []
+        if pending_docs:
+            self._write(pending_docs, pending_vectors, user_tier)
+
+        elapsed = time.perf_counter() - start
+        stats = {"docs": len(docs), "batches": len(batches), "seconds": round(elapsed, 3),
+                 "docs_per_sec": round(len(docs) / elapsed, 1) if elapsed else float("inf")}
+        print(f" -> {stats}")
+        return stats
+
+    def _chroma(self):
+        """The raw chromadb collection + max batch size behind the LangChain wrapper.
+        Private attributes: written against langchain-chroma 0.2.x / chromadb 1.x. Only touched here."""
+        return self.local_db._collection, self.local_db._client.get_max_batch_size()
+
+    def _write(self, docs: List[Document], vectors: List[List[float]], user_tier: str):
+        # Same text twice in one batch = same id twice, which Chroma rejects: the last one wins.
+        by_id = {content_id(d): (d, v) for d, v in zip(docs, vectors)}
+        ids = list(by_id)
+        docs = [d for d, _ in by_id.values()]
+        vectors = [v for _, v in by_id.values()]
+        if user_tier == "free":
+            # Chroma's public add_documents() would embed again, so we upsert the
+            # pre-computed vectors into the underlying collection, one transaction per max batch.
+            collection, max_batch = self._chroma()
+            for i in range(0, len(docs), max_batch):
+                collection.upsert(
+                    ids=ids[i:i + max_batch],
+                    embeddings=vectors[i:i + max_batch],
+                    documents=[d.page_content for d in docs[i:i + max_batch]],
+                    # Chroma rejects empty metadata dicts, so every row carries its tier.
+                    metadatas=[{**d.metadata, "tier": user_tier} for d in docs[i:i + max_batch]],
+                )
+        else:
+            # self.pinecone.upsert(vectors=[...], batch_size=...)
+            for doc_id, doc, vector in zip(ids, docs, vectors):
+                self.cloud_db_mock[doc_id] = {"text": doc.page_content, "embedding": vector}
+
+    def ingest_tenant(self, docs: List[Document], tenant_id: str):
+        """Embeds in one batch call and upserts into the tenant's own shard."""
+        self._write_tenant(docs, self.embeddings.embed_documents([d.page_content for d in docs]), tenant_id)
+
+    def _write_tenant(self, docs: List[Document], vectors: List[List[float]], tenant_id: str):
+        # Same id twice in one batch: the last one wins (the shard would otherwise append it twice).
+        by_id = {d.id or content_id(d): (d, v) for d, v in zip(docs, vectors)}
+        with self.shards.open(tenant_id) as shard:
+            shard.upsert(list(by_id), [v for _, v in by_id.values()], [d for d, _ in by_id.values()])
+
+    def search_tenant(self, query: str, tenant_id: str, k: int = 4) -> List[Document]:
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+        with self.shards.open(tenant_id) as shard:
+            return [doc for _, doc in shard.search(query_vector, k)]
+
+    def search(self, query: str, user_tier: str, k: int = 1):
         print(f"Searching for {user_tier} user...")
         if user_tier == "free":
-            return self.local_db.similarity_search(query, k=1)
+            return self.local_db.similarity_search(query, k=k)
         elif user_tier == "pro":
             return [Document(page_content="Cloud Result: Fast & Scalable")]
 
+    # --- Scatter-Gather ---
+    # Org-wide search = many shards. Sequential: latency = SUM of shard latencies.
+    # Scatter-gather: every shard at once, each with a DEADLINE (measured from fan-out);
+    # partial top-k lists are merged with a k-sized heap. Latency = the slowest shard that made its deadline.
+    # Every shard returns COSINE similarity, so scores are comparable across shards and tiers.
+    # Load shedding as in 03_RAG_Zero_to_Hero/11_parallel_hybrid_retriever.py, per shard: see "shed" in the result.
+    def _shard_searchers(self, query_vector: np.ndarray, k: int, tenant_ids: Iterable[str],
+                         tiers: Iterable[str]) -> Dict[str, Callable[[], List[Tuple[float, Document]]]]:
+        def tenant(tenant_id):
+            def run():
+                with self.shards.open(tenant_id) as shard:
+                    return shard.search(query_vector, k)
+            return run
+
+        def free_tier():
+            # Chroma returns distances in its own metric; re-score its candidates with cosine.
+            found = self._chroma()[0].query(query_embeddings=[query_vector.tolist()], n_results=k,
+                                            include=["documents", "metadatas", "embeddings"])
+            if not found["ids"][0]:
+                return []
+            vectors = np.asarray(found["embeddings"][0], dtype=np.float32)
+            scores = vectors @ query_vector / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+            return [(float(score), Document(page_content=text, metadata=meta or {}, id=doc_id))
+                    for score, text, meta, doc_id in zip(scores, found["documents"][0], found["metadatas"][0], found["ids"][0])]
+
+        def pro_tier():
+            # Pinecone stand-in: brute force over the mocked cloud dict.
+            rows = [(doc_id, v) for doc_id, v in self.cloud_db_mock.items() if isinstance(v, dict)]
+            if not rows:
+                return []
+            vectors = np.asarray([v["embedding"] for _, v in rows], dtype=np.float32)
+            scores = vectors @ query_vector / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+            top = np.argsort(-scores)[:k]
+            return [(float(scores[i]), Document(page_content=rows[i][1]["text"], id=rows[i][0])) for i in top]
+
+        searchers = {f"tenant:{t}": tenant(t) for t in tenant_ids}
+        tier_searchers = {"free": free_tier, "pro": pro_tier}
+        searchers.update({f"tier:{t}": tier_searchers[t] for t in tiers})
+        return searchers
+
+    def search_many(self, query: str, tenant_ids: Iterable[str] = (), tiers: Iterable[str] = ("free", "pro"),
+                    k: int = 4, timeout: float = 0.5, timeouts: Optional[Dict[str, float]] = None) -> dict:
+        """Returns {"results": [(score, doc)], "timed_out": [...], "failed": [...], "shed": [...], "shards": n,
+        "seconds": t}."""
+        start = time.monotonic()
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)  # Embedded ONCE for all shards
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+        searchers = self._shard_searchers(query_vector, k, tenant_ids, tiers)
+        fan_out = time.monotonic()
+        with self._stragglers_lock:
+            self._stragglers = {name: running for name, fs in self._stragglers.items()
+                                if (running := [f for f in fs if not f.done()])}
+            shed = [name for name in searchers if len(self._stragglers.get(name, ())) >= self.max_stragglers_per_shard]
+        futures = {name: _SCATTER_POOL.submit(fn) for name, fn in searchers.items() if name not in shed}
+
+        heap: List[Tuple[float, int, Document]] = []  # Min-heap of the best k so far (worst on top)
+        timed_out, failed, tiebreak = [], [], 0
+        deadline_of = lambda name: (timeouts or {}).get(name, timeout)
+        for name in sorted(futures, key=deadline_of):  # Shortest deadline first
+            remaining = max(0.0, deadline_of(name) - (time.monotonic() - fan_out))
+            try:
+                partial = futures[name].result(timeout=remaining)
+            except FuturesTimeout:
+                if not futures[name].cancel():
+                    with self._stragglers_lock:
+                        self._stragglers.setdefault(name, []).append(futures[name])
+                timed_out.append(name)
+                continue
+            except Exception:
+                failed.append(name)
+                continue
+            for score, doc in partial:
+                tiebreak += 1
+                item = (score, tiebreak, Document(page_content=doc.page_content,
+                                                  metadata={**doc.metadata, "shard": name}, id=doc.id))
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, item)
+
+        results = [(score, doc) for score, _, doc in sorted(heap, reverse=True)]
+        return {"results": results, "timed_out": timed_out, "failed": failed, "shed": shed, "shards": len(searchers),
+                "seconds": round(time.monotonic() - start, 3)}
+
+# ==========================================
+# Write-Coalescing Async Ingest
+# Bursty uploads = thousands of 1-doc ingest() calls = thousands of tiny embedding requests and writes.
+# AsyncIngestQueue puts docs on a PER-SHARD queue; a worker per shard flushes them as ONE
+# bulk embed + upsert when `max_batch_size` docs are waiting or `max_delay` seconds have passed.
+# - BACKPRESSURE: queues are bounded; submit() waits when a shard's queue is full
+# - READ-YOUR-WRITES: submit(..., wait=True) returns only once the doc is searchable; flush() drains everything
+# - IDLE CLEANUP: a shard's worker exits after `idle_timeout` without docs; the next submit() starts a new one
+# ==========================================
+ShardKey = Tuple[str, str]  # ("tier", "free" | "pro") or ("tenant", tenant_id)
+
+class AsyncIngestQueue:
+    def __init__(self, router: VectorStoreRouter, max_batch_size: int = 256, max_delay: float = 0.05,
+                 max_queue_size: int = 2048, idle_timeout: float = 30.0):
+        self.router = router
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_queue_size = max_queue_size
+        self.idle_timeout = idle_timeout  # A shard's worker + queue are dropped after this long without docs
+        self._queues: Dict[ShardKey, asyncio.Queue] = {}
+        self._workers: Dict[ShardKey, asyncio.Task] = {}
+        self.embedding_calls = 0
+
+    async def submit(self, doc: Document, *, tenant_id: Optional[str] = None, user_tier: Optional[str] = None,
+                     wait: bool = False) -> Union[asyncio.Future, None]:
+        if (tenant_id is None) == (user_tier is None):
+            raise ValueError("Pass exactly one of tenant_id or user_tier")
+        if user_tier is not None and user_tier not in ("free", "pro"):
+            raise ValueError("Unknown Tier")
+        key = ("tenant", tenant_id) if tenant_id is not None else ("tier", user_tier)
+        if key not in self._queues:
+            self._queues[key] = asyncio.Queue(maxsize=self.max_queue_size)
+            self._workers[key] = asyncio.create_task(self._worker(key, self._queues[key]))
+        done = asyncio.get_running_loop().create_future()
+        await self._queues[key].put((doc, done))  # Blocks while the queue is full (backpressure)
+        if wait:
+            await done
+            return None
+        return done
+
+    async def _worker(self, key: ShardKey, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                batch = [await asyncio.wait_for(queue.get(), self.idle_timeout)]
+            except asyncio.TimeoutError:
+                # Idle: with thousands of tenants, idle workers would pile up. No await between this check and
+                # the removal, so submit() either sees this queue non-empty or creates a fresh worker.
+                if queue.empty():
+                    del self._queues[key], self._workers[key]
+                    return
+                continue
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Same id twice in one batch (a double-submitted upload): embed and write it once, the last one wins.
+            # Ids match the router's: content hash for tiers, doc.id (else content hash) for tenants.
+            doc_id = content_id if key[0] == "tier" else (lambda d: d.id or content_id(d))
+            docs = list({doc_id(doc): doc for doc, _ in batch}.values())
+            try:
+                await self._write(key, docs)
+                for _, done in batch:
+                    if not done.done():
+                        done.set_result(True)
+            except Exception as e:  # The whole batch failed: every waiting caller sees the error
+                # Fire-and-forget callers may never await their future, so the failure is logged here instead.
+                logger.error("ingest batch of %d docs for %s:%s failed: %r", len(docs), *key, e)
+                for _, done in batch:
+                    if not done.done():
+                        done.set_exception(e)
+                        done.exception()  # Mark retrieved: no "exception was never retrieved" noise; await still raises
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _write(self, key: ShardKey, docs: List[Document]):
+        vectors = []
+        for batch in token_batches(docs):  # Still respect the embedding API's token limit
+            vectors.extend(await self.router.embeddings.aembed_documents([d.page_content for d in batch]))
+            self.embedding_calls += 1
+        kind, name = key
+        if kind == "tenant":
+            await asyncio.to_thread(self.router._write_tenant, docs, vectors, name)
+        else:
+            await asyncio.to_thread(self.router._write, docs, vectors, name)
+
+    async def flush(self):
+        """Waits until every doc submitted so far is written."""
+        await asyncio.gather(*(q.join() for q in self._queues.values()))
+
+    async def close(self):
+        await self.flush()
+        for task in self._workers.values():
+            task.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._queues.clear()
+        self._workers.clear()
+
 # Run
 router = VectorStoreRouter()
 doc = Document(page_content="The user is on the free plan.")
@@ -57,6 +623,121 @@ print(f"Free Search Result: {res_free[0].page_content}")
 res_pro = router.search("plan", "pro")
 print(f"Pro Search Result: {res_pro[0].page_content}")
 
+# 3. Bulk Ingest Benchmark (Fake embedding backend, no API cost)
+class FakeLatencyEmbeddings(Embeddings):
+    """Simulates an embedding API: fixed round-trip latency per request + small cost per text."""
+    def __init__(self, latency: float = 0.02, per_text: float = 0.0002):
+        self.inner = DeterministicFakeEmbedding(size=1536)
+        self.latency, self.per_text = latency, per_text
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency + self.per_text * len(texts))
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+print("\n--- Benchmark: One-by-one vs Bulk Ingest ---")
+bench_docs = [Document(page_content=f"Support ticket {i}: customer cannot reset password on plan {i % 7}.")
+              for i in range(300)]
+
+slow_router = VectorStoreRouter(embeddings=FakeLatencyEmbeddings(), collection_name="bench_one_by_one")
+start = time.perf_counter()
+for d in bench_docs:
+    slow_router.local_db.add_documents([d])  # What ingest() does: 1 embed + 1 write per doc
+one_by_one = time.perf_counter() - start
+print(f"One-by-one: {len(bench_docs) / one_by_one:.1f} docs/sec")
+
+fast_router = VectorStoreRouter(embeddings=FakeLatencyEmbeddings(), collection_name="bench_bulk")
+bulk_stats = fast_router.ingest_bulk(bench_docs, "free", max_batch_tokens=2000)
+print(f"Bulk:       {bulk_stats['docs_per_sec']} docs/sec ({bulk_stats['batches']} embedding batches)")
+
 # Clean
+slow_router.local_db.delete_collection()
+fast_router.local_db.delete_collection()
+
+print("\n--- Benchmark: 2,000 concurrent uploads to 10 tenants, per-doc vs coalesced ---")
+async def bursty_upload(ingest_one, drain=None, n_docs=2000, n_tenants=10, n_clients=100):
+    async def client(c):
+        for i in range(c, n_docs, n_clients):
+            await ingest_one(Document(page_content=f"Upload {i}: contract clause {i % 37}."), f"tenant-{i % n_tenants}")
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(n_clients)))
+    if drain:
+        await drain()  # Count only docs that are actually written
+    return n_docs / (time.perf_counter() - start)
+
+ingest_root = tempfile.mkdtemp(prefix="ingest_bench_")
+per_doc_router = VectorStoreRouter(embeddings=FakeLatencyEmbeddings(), collection_name="ingest_per_doc",
+                                   shard_root=os.path.join(ingest_root, "per_doc"))
+async def ingest_per_doc(doc, tenant_id):
+    await asyncio.to_thread(per_doc_router.ingest_tenant, [doc], tenant_id)  # 1 embed + 1 write per doc
+print(f"Per-doc:   {asyncio.run(bursty_upload(ingest_per_doc)):7.1f} docs/sec (2000 embedding calls)")
+
+coalesced_router = VectorStoreRouter(embeddings=FakeLatencyEmbeddings(), collection_name="ingest_coalesced",
+                                     shard_root=os.path.join(ingest_root, "coalesced"))
+async def coalesced_run():
+    queue = AsyncIngestQueue(coalesced_router, max_batch_size=256, max_delay=0.05)
+    rate = await bursty_upload(lambda doc, tenant_id: queue.submit(doc, tenant_id=tenant_id), drain=queue.flush)
+    # Read-your-writes: wait=True returns once the doc is searchable.
+    await queue.submit(Document(page_content="Urgent: refund policy changed today."), tenant_id="tenant-0", wait=True)
+    found = coalesced_router.search_tenant("Urgent: refund policy changed today.", "tenant-0", k=1)[0]
+    await queue.close()
+    return rate, queue.embedding_calls, found
+rate, calls, found = asyncio.run(coalesced_run())
+print(f"Coalesced: {rate:7.1f} docs/sec ({calls} embedding calls)")
+print(f"Read-your-writes: {found.page_content}")
+for r in (per_doc_router, coalesced_router):
+    r.shards.close_all()
+    r.local_db.delete_collection()
+shutil.rmtree(ingest_root, ignore_errors=True)
+
+print("\n--- Per-Tenant Shards: 500 tenants, RAM budget for ~50 ---")
+shard_root = tempfile.mkdtemp(prefix="tenant_shards_")
+tenant_router = VectorStoreRouter(embeddings=DeterministicFakeEmbedding(size=1536), collection_name="tenants",
+                                  shard_root=shard_root, shard_memory_budget_bytes=50 * 40 * 1536 * 4)
+for t in range(500):
+    tenant_router.ingest_tenant(
+        [Document(page_content=f"Tenant {t} document {i}: invoice policy v{i}.") for i in range(40)], f"tenant-{t}"
+    )
+print(f"After ingest:        {tenant_router.shards.stats()}")
+# Traffic is skewed: 20 tenants are active right now.
+for i in range(2000):
+    tenant_router.search_tenant("invoice policy", f"tenant-{i % 20}", k=3)
+print(f"After 2000 searches: {tenant_router.shards.stats()}")
+hit = tenant_router.search_tenant("invoice policy", "tenant-499", k=1)[0]  # Evicted earlier -> lazily re-opened from disk
+print(f"Re-opened tenant-499 from disk: {hit.page_content}")
+tenant_router.shards.close_all()
+tenant_router.local_db.delete_collection()
+shutil.rmtree(shard_root, ignore_errors=True)
+
+print("\n--- Scatter-Gather: org-wide search, 20ms per remote shard, one 1s straggler ---")
+class RemoteShardRouter(VectorStoreRouter):
+    """Adds network latency to every shard search, like shards living on other machines."""
+    def _shard_searchers(self, query_vector, k, tenant_ids, tiers):
+        def remote(name, fn):
+            def run():
+                time.sleep(1.0 if name == "tenant:tenant-7" else 0.02)
+                return fn()
+            return run
+        return {name: remote(name, fn) for name, fn in super()._shard_searchers(query_vector, k, tenant_ids, tiers).items()}
+
+scatter_root = tempfile.mkdtemp(prefix="scatter_bench_")
+org_router = RemoteShardRouter(embeddings=DeterministicFakeEmbedding(size=1536), collection_name="org_free",
+                               shard_root=scatter_root)
+for t in range(200):
+    org_router.ingest_tenant([Document(page_content=f"Tenant {t}: travel policy rev {i}.") for i in range(20)], f"tenant-{t}")
+org_router.ingest_bulk([Document(page_content="Free plan: travel policy summary.")], "free")
+org_router.ingest_bulk([Document(page_content="Pro plan: travel policy summary.")], "pro")
+
+for n in (10, 50, 200):
+    tenants = [f"tenant-{t}" for t in range(n)]
+    org = org_router.search_many("travel policy", tenant_ids=tenants, k=5, timeout=0.3)
+    print(f"{org['shards']:>3} shards: {org['seconds'] * 1000:5.0f}ms (sequential would be ~{org['shards'] * 20}ms+), "
+          f"timed out: {org['timed_out']}, shed: {org['shed']}")
+print(f"Top hit: {org['results'][0][1].page_content} (from {org['results'][0][1].metadata['shard']})")
+org_router.shards.close_all()
+org_router.local_db.delete_collection()
+shutil.rmtree(scatter_root, ignore_errors=True)
 # self.local_db.delete_collection()
 print("\n[System] Router Pattern enables Multi-Tenant RAG at scale.")
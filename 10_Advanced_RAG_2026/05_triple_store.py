@@ -0,0 +1,269 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================================
+# CONCEPT: Persistent Triple Store
+# The NetworkX graph in Lesson 2 is rebuilt in RAM on every start.
+# A triple store keeps (subject, predicate, object) on disk with 3 sorted indexes:
+#   SPO -> "what does X point to?"      (outgoing edges)
+#   POS -> "who has relation P to Y?"   (by relation)
+#   OSP -> "what points to Y?"          (incoming edges)
+# Every lookup is a B-tree range scan: sub-millisecond, no matter how big the graph.
+# Startup = opening a file. Only the pages you touch are read, so the graph can be larger than RAM.
+# ==========================================
+
+print("--- Lesson 5: Persistent Triple Store (SQLite) ---")
+
+Triple = Tuple[str, str, str]
+
+class TripleStore:
+    _BATCH = 50_000
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entities (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS relations (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+            -- WITHOUT ROWID: the table IS the SPO B-tree, no separate rowid lookup.
+            CREATE TABLE IF NOT EXISTS triples (s INTEGER, p INTEGER, o INTEGER, PRIMARY KEY (s, p, o)) WITHOUT ROWID;
+            CREATE TEMP TABLE staging (s TEXT, p TEXT, o TEXT);
+        """)
+        self._create_secondary_indexes()
+
+    def _create_secondary_indexes(self):
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pos ON triples (p, o, s)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS osp ON triples (o, s, p)")
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+
+    def __contains__(self, entity: str) -> bool:
+        return self._entity_id(entity) is not None
+
+    def _entity_id(self, name: str) -> Optional[int]:
+        row = self.conn.execute("SELECT id FROM entities WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    # --- Writes ---
+    def _flush_staging(self) -> int:
+        # Names -> integer ids in SQL (set-based), then one INSERT ... SELECT into the triple table.
+        self.conn.execute("INSERT OR IGNORE INTO entities (name) SELECT s FROM staging UNION SELECT o FROM staging")
+        self.conn.execute("INSERT OR IGNORE INTO relations (name) SELECT DISTINCT p FROM staging")
+        added = self.conn.execute("""
+            INSERT OR IGNORE INTO triples (s, p, o)
+            SELECT es.id, r.id, eo.id FROM staging
+            JOIN entities es ON es.name = staging.s
+            JOIN relations r ON r.name = staging.p
+            JOIN entities eo ON eo.name = staging.o
+        """).rowcount
+        self.conn.execute("DELETE FROM staging")
+        return added
+
+    def upsert(self, triples: Iterable[Triple]) -> int:
+        """Inserts new triples, ignores existing ones. Returns how many were added."""
+        added, batch = 0, []
+        with self.conn:
+            for triple in triples:
+                batch.append(triple)
+                if len(batch) >= self._BATCH:
+                    self.conn.executemany("INSERT INTO staging VALUES (?, ?, ?)", batch)
+                    added += self._flush_staging()
+                    batch = []
+            if batch:
+                self.conn.executemany("INSERT INTO staging VALUES (?, ?, ?)", batch)
+                added += self._flush_staging()
+        return added
+
+    def delete(self, triples: Iterable[Triple]):
+        with self.conn:
+            self.conn.executemany("""
+                DELETE FROM triples WHERE
+                    s = (SELECT id FROM entities WHERE name = ?) AND
+                    p = (SELECT id FROM relations WHERE name = ?) AND
+                    o = (SELECT id FROM entities WHERE name = ?)
+            """, triples)
+
+    def bulk_load(self, path: str) -> int:
+        """Loads a .tsv (subject<TAB>predicate<TAB>object) or .jsonl ({"s":..,"p":..,"o":..}) dump."""
+        empty = self.conn.execute("SELECT 1 FROM triples LIMIT 1").fetchone() is None
+        if empty:
+            # Building secondary indexes once at the end is much faster than updating them per row.
+            self.conn.execute("DROP INDEX IF EXISTS pos")
+            self.conn.execute("DROP INDEX IF EXISTS osp")
+        added = self.upsert(read_triples(path))
+        if empty:
+            with self.conn:
+                self._create_secondary_indexes()
+            self.conn.execute("ANALYZE")
+        return added
+
+    # --- Reads ---
+    def match(self, s: Optional[str] = None, p: Optional[str] = None, o: Optional[str] = None,
+              limit: Optional[int] = None) -> List[Triple]:
+        """Pattern query; None = wildcard. SQLite picks SPO, POS or OSP from the bound positions."""
+        clauses, params = [], []
+        for column, table, value in (("s", "entities", s), ("p", "relations", p), ("o", "entities", o)):
+            if value is not None:
+                clauses.append(f"t.{column} = (SELECT id FROM {table} WHERE name = ?)")
+                params.append(value)
+        sql = """
+            SELECT es.name, r.name, eo.name FROM triples t
+            JOIN entities es ON es.id = t.s JOIN relations r ON r.id = t.p JOIN entities eo ON eo.id = t.o
+        """
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.conn.execute(sql, params).fetchall()
+
+    def neighbors(self, entity: str, direction: str = "out", limit: Optional[int] = None) -> List[Triple]:
+        if direction == "out":
+            return self.match(s=entity, limit=limit)
+        if direction == "in":
+            return self.match(o=entity, limit=limit)
+        return self.match(s=entity, limit=limit) + self.match(o=entity, limit=limit)
+
+    def _expand(self, ids: List[int]) -> Iterator[Tuple[int, int, int]]:
+        for start in range(0, len(ids), 500):  # SQLite parameter limit
+            chunk = ids[start:start + 500]
+            yield from self.conn.execute(
+                f"SELECT s, p, o FROM triples WHERE s IN ({','.join('?' * len(chunk))})", chunk
+            )
+
+    def _names(self, table: str, ids: Iterable[int]) -> dict:
+        ids, names = list(set(ids)), {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            names.update(self.conn.execute(
+                f"SELECT id, name FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return names
+
+    def k_hop(self, start_entity: str, max_depth: int = 2, max_facts: Optional[int] = None) -> List[Triple]:
+        """Lesson 2's multi-hop BFS, one SQL range scan per frontier instead of one dict lookup per node.
+        Outgoing edges in BFS order; [] if the entity is unknown."""
+        start = self._entity_id(start_entity)
+        if start is None:
+            return []
+        visited, frontier, edges = {start}, [start], []
+        for _ in range(max_depth):
+            next_frontier = []
+            for s, p, o in self._expand(frontier):
+                edges.append((s, p, o))
+                if o not in visited:
+                    visited.add(o)
+                    next_frontier.append(o)
+            frontier = next_frontier
+            if not frontier or (max_facts and len(edges) >= max_facts):
+                break
+
+        edges = edges[:max_facts]
+        entity = self._names("entities", [e for s, _, o in edges for e in (s, o)])
+        relation = self._names("relations", [p for _, p, _ in edges])
+        return [(entity[s], relation[p], entity[o]) for s, p, o in edges]
+
+    def close(self):
+        self.conn.close()
+
+
+def read_triples(path: str) -> Iterator[Triple]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row["s"], row["p"], row["o"]
+        else:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) == 3:
+                    yield parts[0], parts[1], parts[2]
+
+
+def graph_search(store: TripleStore, start_entity: str, max_depth=2, max_facts: Optional[int] = None):
+    """Lesson 2's graph_search, same output, backed by the triple store."""
+    print(f"\nSearching Triple Store starting from: '{start_entity}'...")
+    if start_entity not in store:
+        return "Entity not found in Knowledge Graph."
+    return [f"{s} -> [{p}] -> {o}" for s, p, o in store.k_hop(start_entity, max_depth, max_facts)]
+
+
+# 1. The Knowledge Base (same as Lesson 2), now persisted
+text_data = [
+    ("Elon Musk", "founded", "SpaceX"),
+    ("SpaceX", "created", "Starship"),
+    ("Starship", "destined_for", "Mars"),
+    ("Mars", "is_a", "Planet")
+]
+
+workdir = tempfile.mkdtemp(prefix="triple_store_")
+jsonl_dump = os.path.join(workdir, "kg.jsonl")
+with open(jsonl_dump, "w", encoding="utf-8") as f:
+    f.writelines(json.dumps({"s": s, "p": p, "o": o}) + "\n" for s, p, o in text_data)
+
+store = TripleStore(os.path.join(workdir, "kg.sqlite"))
+print(f"Bulk loaded {store.bulk_load(jsonl_dump)} triples from JSONL")
+print(f"Upsert again: added {store.upsert(text_data)} (already stored)")
+store.upsert([("Starship", "built_in", "Texas")])  # Incremental update, no rebuild
+
+print(f"Outgoing from SpaceX: {store.neighbors('SpaceX')}")
+print(f"Incoming to Mars:     {store.neighbors('Mars', direction='in')}")
+print(f"Who is_a Planet:      {store.match(p='is_a', o='Planet')}")
+
+results = graph_search(store, "Elon Musk", max_depth=3)
+print("\nRetrieved Facts from Triple Store:")
+for r in results:
+    print(r)
+store.close()
+
+# 2. Benchmark: startup + single-hop lookups, NetworkX vs Triple Store
+print("\n--- Benchmark: 1,000,000-triple TSV dump ---")
+rng = np.random.default_rng(0)
+n_nodes, n_edges = 200_000, 1_000_000
+src, dst, rel = rng.integers(0, n_nodes, n_edges), rng.integers(0, n_nodes, n_edges), rng.integers(0, 20, n_edges)
+dump = os.path.join(workdir, "dump.tsv")
+with open(dump, "w", encoding="utf-8") as f:
+    f.writelines(f"e{s}\tr{r}\te{d}\n" for s, r, d in zip(src.tolist(), rel.tolist(), dst.tolist()))
+
+start = time.perf_counter()
+G = nx.DiGraph()
+for subject, relation, object_ in read_triples(dump):
+    G.add_edge(subject, object_, relation=relation)
+print(f"NetworkX startup (rebuild from dump): {time.perf_counter() - start:6.2f}s, on every start")
+
+bench_path = os.path.join(workdir, "bench.sqlite")
+start = time.perf_counter()
+TripleStore(bench_path).bulk_load(dump)
+print(f"Triple store bulk load:               {time.perf_counter() - start:6.2f}s, once")
+
+start = time.perf_counter()
+bench = TripleStore(bench_path)
+print(f"Triple store startup (open file):     {(time.perf_counter() - start) * 1000:6.2f}ms")
+
+probes = [f"e{i}" for i in rng.integers(0, n_nodes, 1000).tolist()]
+start = time.perf_counter()
+for p in probes:
+    bench.neighbors(p)
+print(f"Single-hop lookup:                    {(time.perf_counter() - start) * 1000 / len(probes):6.3f}ms (outgoing)")
+start = time.perf_counter()
+for p in probes:
+    bench.neighbors(p, direction="in")
+print(f"Single-hop lookup:                    {(time.perf_counter() - start) * 1000 / len(probes):6.3f}ms (incoming, OSP index)")
+bench.close()
+
+shutil.rmtree(workdir, ignore_errors=True)
+print("\n[System] Same idea as Neo4j / RDF stores: index every access pattern, never load the whole graph.")
@@ -0,0 +1,220 @@
+import asyncio
+import contextlib
+import importlib.util
+import io
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Callable, Dict, List, Tuple
+
+import networkx as nx
+import tiktoken
+from dotenv import load_dotenv
+from langchain_chroma import Chroma
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.retrievers import BaseRetriever
+
+load_dotenv()
+
+# ==========================================
+# CONCEPT: Hybrid Graph + Vector Retrieval
+# Graph: great at multi-hop ("How is Musk connected to Mars?"), returns short FACTS.
+# Vector: great at fuzzy topical matches, returns CHUNKS.
+# The hybrid retriever runs both AT THE SAME TIME:
+#   Path A: link entities -> k-hop expansion -> facts + chunks of the reached entities (cached entity -> chunk map)
+#   Path B: vector similarity search
+# Then one TOKEN BUDGET is filled: facts first (dense), then chunks by priority.
+# Latency = the slower of the two paths, not their sum.
+# ==========================================
+
+print("--- Lesson 6: Hybrid Graph + Vector Retriever ---")
+
+Triple = Tuple[str, str, str]
+
+# Graph queries are I/O bound in production (Neo4j round-trips): one per linked entity, all at once.
+_HOP_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="k-hop")
+
+@lru_cache(maxsize=1)
+def _tokenizer():
+    return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str) -> int:
+    return len(_tokenizer().encode(text, disallowed_special=()))
+
+def load_lesson(filename: str):
+    """Imports a sibling lesson script (file names start with a digit, so no plain `import`). Its demo output is muted."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(filename)[0].lstrip("0123456789_"), path)
+    module = importlib.util.module_from_spec(spec)
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(module)
+    return module
+
+# Lesson 2 provides both backends: k_hop (BFS over NetworkX) and EntityLinker (exact + fuzzy linking).
+# Lesson 5's TripleStore.k_hop has the same (entity, max_depth) -> triples shape and is a drop-in
+# persistent backend (one per thread: a SQLite connection can't be shared across the hop pool).
+graph_rag = load_lesson("02_graph_rag_local.py")
+
+def alias_patterns(aliases: Dict[str, List[str]]) -> Dict[str, "re.Pattern"]:
+    """entity -> one case-insensitive, WHOLE-WORD regex over all its aliases ("Mars" must not match "Marshall")."""
+    return {entity: re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b", re.IGNORECASE)
+            for entity, names in aliases.items()}
+
+def build_entity_chunk_map(chunks: List[Document], aliases: Dict[str, List[str]]) -> Dict[str, List[int]]:
+    """entity -> indexes of chunks that mention it (any alias). Built ONCE at index time, not per query."""
+    patterns = alias_patterns(aliases)
+    return {entity: [i for i, c in enumerate(chunks) if pattern.search(c.page_content)]
+            for entity, pattern in patterns.items()}
+
+
+class HybridGraphVectorRetriever(BaseRetriever):
+    link: Callable[[str], List[str]]              # question -> canonical entity names
+    k_hop: Callable[[str, int], List[Triple]]     # (entity, max_depth) -> triples
+    vector_retriever: BaseRetriever
+    chunks: List[Document]                        # Indexed chunks, addressed by entity_chunks
+    entity_chunks: Dict[str, List[int]]           # Cached entity -> chunk indexes
+    max_depth: int = 2
+    token_budget: int = 1000
+    max_graph_share: float = 0.4                  # Facts may use at most 40% of the budget
+
+    # --- Path A ---
+    def _graph_path(self, query: str) -> Tuple[List[Triple], List[int]]:
+        triples, seen = [], set()
+        expansions = _HOP_POOL.map(lambda entity: self.k_hop(entity, self.max_depth), self.link(query))
+        for expansion in expansions:
+            for triple in expansion:
+                if triple not in seen:
+                    seen.add(triple)
+                    triples.append(triple)
+        # Chunks about the reached entities, closest hops first (triples are in BFS order).
+        reached = [e for t in triples for e in (t[0], t[2])]
+        chunk_ids = list(dict.fromkeys(i for e in reached for i in self.entity_chunks.get(e, [])))
+        return triples, chunk_ids
+
+    # --- Merge ---
+    def _merge(self, triples: List[Triple], graph_chunk_ids: List[int], vector_docs: List[Document]) -> List[Document]:
+        results, used = [], 0
+        for s, p, o in triples:
+            fact = f"{s} -> [{p}] -> {o}"
+            cost = count_tokens(fact)
+            if used + cost > self.token_budget * self.max_graph_share:
+                break
+            results.append(Document(page_content=fact, metadata={"source": "graph"}))
+            used += cost
+
+        # Chunks: vector hits and graph-linked chunks interleaved, so neither path starves the other.
+        vector_items = [(d, "vector") for d in vector_docs]
+        graph_items = [(self.chunks[i], "graph_entity") for i in graph_chunk_ids]
+        interleaved = [x for pair in zip(vector_items, graph_items) for x in pair]
+        interleaved += vector_items[len(graph_items):] + graph_items[len(vector_items):]
+
+        seen = set()
+        for doc, source in interleaved:
+            if doc.page_content in seen:
+                continue
+            cost = count_tokens(doc.page_content)
+            if used + cost > self.token_budget:
+                continue  # A shorter chunk further down may still fit
+            seen.add(doc.page_content)
+            results.append(Document(page_content=doc.page_content, metadata={**doc.metadata, "source": source}))
+            used += cost
+        return results
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            graph_future = pool.submit(self._graph_path, query)
+            vector_future = pool.submit(self.vector_retriever.invoke, query, {"callbacks": run_manager.get_child()})
+            triples, chunk_ids = graph_future.result()
+            vector_docs = vector_future.result()
+        return self._merge(triples, chunk_ids, vector_docs)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        (triples, chunk_ids), vector_docs = await asyncio.gather(
+            asyncio.to_thread(self._graph_path, query),
+            self.vector_retriever.ainvoke(query, {"callbacks": run_manager.get_child()}),
+        )
+        return self._merge(triples, chunk_ids, vector_docs)
+
+
+# 1. Knowledge: graph (from Lesson 2) + chunks (from RAG Part 2)
+text_data = [
+    ("Elon Musk", "founded", "SpaceX"),
+    ("SpaceX", "created", "Starship"),
+    ("Starship", "destined_for", "Mars"),
+    ("Mars", "is_a", "Planet")
+]
+G = nx.DiGraph()
+for subject, relation, object_ in text_data:
+    G.add_edge(subject, object_, relation=relation)
+
+chunks = [
+    Document(page_content="SpaceX was founded in 2002 to reduce space transportation costs."),
+    Document(page_content="Starship is a fully reusable super heavy-lift launch vehicle."),
+    Document(page_content="Mars has a thin atmosphere made mostly of carbon dioxide."),
+    Document(page_content="Elon Musk also leads Tesla, an electric vehicle company."),
+    Document(page_content="Bananas are a good source of potassium."),
+]
+ALIASES = {
+    "Elon Musk": ["Elon Musk", "Musk"],
+    "SpaceX": ["SpaceX", "Space X"],
+    "Starship": ["Starship"],
+    "Mars": ["Mars", "the red planet"],
+}
+entity_chunks = build_entity_chunk_map(chunks, ALIASES)
+
+# Question -> canonical names with Lesson 2's linker: aliases, typos ("Starshp") and the red planet.
+linker = graph_rag.EntityLinker(G.nodes(), ALIASES)
+
+# 2. Both paths with simulated network latency: graph DB 200ms, vector DB 300ms.
+local_k_hop = partial(graph_rag.k_hop, G)
+def slow_k_hop(entity: str, max_depth: int) -> List[Triple]:
+    time.sleep(0.2)
+    return local_k_hop(entity, max_depth)
+
+class SlowRetriever(BaseRetriever):
+    retriever: BaseRetriever
+    delay: float
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        time.sleep(self.delay)
+        return self.retriever.invoke(query)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        await asyncio.sleep(self.delay)
+        return await self.retriever.ainvoke(query)
+
+# Offline stand-in. In production: OpenAIEmbeddings()
+vector_store = Chroma.from_documents(chunks, DeterministicFakeEmbedding(size=256), collection_name="hybrid_graph_vector")
+vector_retriever = SlowRetriever(retriever=vector_store.as_retriever(search_kwargs={"k": 2}), delay=0.3)
+
+hybrid = HybridGraphVectorRetriever(
+    link=linker.link, k_hop=slow_k_hop, vector_retriever=vector_retriever,
+    chunks=chunks, entity_chunks=entity_chunks, max_depth=3, token_budget=120,
+)
+
+question = "How is Musk connected to the red planet?"
+print(f"\nQuestion: {question}")
+
+start = time.perf_counter()
+hybrid._graph_path(question)
+vector_retriever.invoke(question)
+print(f"Sequential (graph, then vector): {(time.perf_counter() - start) * 1000:.0f}ms")
+
+start = time.perf_counter()
+results = hybrid.invoke(question)
+print(f"Hybrid (parallel):               {(time.perf_counter() - start) * 1000:.0f}ms")
+
+start = time.perf_counter()
+asyncio.run(hybrid.ainvoke(question))
+print(f"Hybrid (async):                  {(time.perf_counter() - start) * 1000:.0f}ms")
+
+print(f"\nEvidence within {hybrid.token_budget} tokens:")
+for doc in results:
+    print(f"[{doc.metadata['source']:<12}] {doc.page_content}")
+
+vector_store.delete_collection()
+print("\n[System] Facts answer the multi-hop 'how', chunks add the detail.")